@@ -1,28 +1,96 @@
-from http.server import BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import json
+import logging
 import os
-from bot import bot
+import threading
+import metrics
+import webhooks
+from poller import utcnow
+
+# bot (and with it discord.py and the Mongo client) is imported only when the
+# process actually runs the bot, so a cold start can answer GET / and /metrics
+# without paying for it.
+
+logger = logging.getLogger('discord_bot.webhooks')
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    # Shared by request threads, created by the first webhook
+    global _database
+    with _database_lock:
+        if _database is None:
+            from database import Database
+            _database = Database()
+    return _database
+
 
 class handler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
+    def _reply(self, status: int, body: bytes, content_type: str = 'text/plain'):
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(b'Bot is running!')
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            self._reply(200, metrics.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
+            return
+
+        self._reply(200, b'Bot is running!')
         return
 
     def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
+        # Panel order-status callback: verify, store durably, acknowledge.
+        # Applying the events to orders is left to webhooks.WebhookConsumer.
+        if not webhooks.WEBHOOK_SECRET:
+            self._reply(503, b'Webhooks are not configured')
+            return
+
+        try:
+            content_length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            content_length = -1
+        if content_length < 0 or content_length > webhooks.WEBHOOK_MAX_BODY:
+            self._reply(413, b'Payload too large')
+            return
         post_data = self.rfile.read(content_length)
-        data = json.loads(post_data)
-        
-        # Handle any webhook events here if needed
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        self.wfile.write(b'Webhook received!')
+
+        if not webhooks.verify_signature(post_data, self.headers.get(webhooks.WEBHOOK_SIGNATURE_HEADER)):
+            self._reply(401, b'Invalid signature')
+            return
+
+        try:
+            events = webhooks.parse_events(post_data, utcnow())
+        except ValueError as e:
+            self._reply(400, str(e).encode('utf-8'))
+            return
+
+        try:
+            stored = get_database().enqueue_webhook_events(events)
+        except Exception as e:
+            # Not stored, so not acknowledged: the panel should retry
+            logger.error(f"Failed to store webhook events: {e}")
+            self._reply(503, b'Temporarily unavailable')
+            return
+
+        self._reply(202, json.dumps({"received": len(events), "new": stored}).encode('utf-8'), 'application/json')
         return
 
+def serve_in_background(port: int):
+    # Serves the handler next to the bot so /metrics reflects this process.
+    # Requests get a thread each, so a slow webhook write never holds up
+    # other acknowledgements or scrapes.
+    server = ThreadingHTTPServer(('', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
 # Start the bot
 if __name__ == "__main__":
-    bot.run(os.getenv('DISCORD_TOKEN')) 
\ No newline at end of file
+    if os.getenv('METRICS_PORT'):
+        serve_in_background(int(os.getenv('METRICS_PORT')))
+    from bot import bot
+    bot.run(os.getenv('DISCORD_TOKEN'))
@@ -0,0 +1,297 @@
+"""Offline latency/throughput benchmark for the slash commands.
+
+Starts the mock panel, points the bot at it (and at an in-process fake Mongo
+unless --mongo-uri is given), then drives the command callbacks with fake
+interactions at the requested concurrency.
+
+    python bench/bench_commands.py --concurrency 20 --requests 200 --latency 0.05
+    python bench/bench_commands.py --compare bench/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_panel import MockPanel, start as start_panel  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+ADMIN_ID = 1000
+SEED_ORDER_BASE = 500000
+COMMANDS = ["balance", "services", "order", "status_one", "status_all", "refill", "cancel"]
+
+
+def load_bot(panel_url: str, mongo_uri: str = None):
+    # Configuration is read at import time, so set it before importing the bot
+    os.environ["PANEL_URL"] = panel_url
+    os.environ.setdefault("API_KEY", "bench")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    os.environ.setdefault("TRACE_SAMPLE_RATE", "0")
+    os.environ.setdefault("ADMIN_SESSION_SYNC_INTERVAL", "0")
+    os.environ.setdefault("WRITE_BEHIND_JOURNAL", os.path.join(tempfile.gettempdir(), f"bench-{os.getpid()}.journal"))
+
+    import database
+    if mongo_uri:
+        os.environ["MONGODB_URI"] = mongo_uri
+    else:
+        from fake_mongo import FakeMongoClient
+        database.MongoClient = FakeMongoClient
+
+    import bot
+    # Per-request logging would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    return bot
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+
+
+class FakeMessage:
+    async def edit(self, **kwargs):
+        return self
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+        self.interaction.record(args, kwargs)
+
+    async def edit_message(self, **kwargs):
+        self._done = True
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, *args, **kwargs):
+        self.interaction.record(args, kwargs)
+        return FakeMessage()
+
+
+class FakeInteraction:
+    def __init__(self, user_id, command):
+        import discord
+        self.type = discord.InteractionType.application_command
+        self.user = FakeUser(user_id)
+        self.guild_id = None
+        self.command = command
+        self.extras = {}
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.replies = []
+
+    def record(self, args, kwargs):
+        self.replies.append((args, kwargs))
+
+    async def edit_original_response(self, **kwargs):
+        return FakeMessage()
+
+    @property
+    def failed(self):
+        # Commands report failures as ephemeral followups
+        return any(kwargs.get("ephemeral") for _, kwargs in self.replies)
+
+
+async def invoke(bot, name: str, **kwargs) -> bool:
+    command = bot.tree.get_command(name)
+    interaction = FakeInteraction(ADMIN_ID, command)
+    await bot.tree.interaction_check(interaction)
+    for check in command.checks:
+        if not await check(interaction):
+            return False
+    await command.callback(interaction, **kwargs)
+    await bot.on_app_command_completion(interaction, command)
+    return not interaction.failed
+
+
+def scenario(bot, name: str, counter):
+    order_id = SEED_ORDER_BASE + next(counter) % 100
+    return {
+        "balance": lambda: invoke(bot, "balance"),
+        "services": lambda: invoke(bot, "services"),
+        "order": lambda: invoke(bot, "order", service_id=1, url="https://example.com/p", quantity=100),
+        "status_one": lambda: invoke(bot, "status", order_id=order_id),
+        "status_all": lambda: invoke(bot, "status"),
+        "refill": lambda: invoke(bot, "refill", order_id=order_id),
+        "cancel": lambda: invoke(bot, "cancel", order_id=order_id),
+    }[name]
+
+
+class LoopMonitor:
+    # Samples event loop wake-up delay while the benchmark runs
+    def __init__(self, interval=0.005, stall_threshold=0.05):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.max_lag = 0.0
+        self.stalled = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.stall_threshold:
+                self.stalled += lag
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def run_command(bot, name, requests, concurrency):
+    counter = itertools.count()
+    latencies, failures = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    monitor = LoopMonitor()
+    monitor.start()
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await scenario(bot, name, counter)()
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    return {
+        "requests": requests,
+        "failures": failures,
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "loop_max_lag_ms": round(monitor.max_lag * 1000, 2),
+        "loop_stalled_ms": round(monitor.stalled * 1000, 2),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous_path: str):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous_path} ({previous.get('revision')})")
+    for name, result in current["commands"].items():
+        before = previous["commands"].get(name)
+        if not before:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            change = (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            deltas.append(f"{key} {before[key]} -> {result[key]} ({change:+.1f}%)")
+        print(f"  {name:11} " + ", ".join(deltas))
+
+
+async def main_async(args):
+    panel = MockPanel(latency=args.latency, error_rate=args.error_rate, cloudflare_rate=args.cloudflare_rate,
+                      catalog_size=args.catalog_size)
+    runner, panel_url = await start_panel(panel)
+    bot = load_bot(panel_url, args.mongo_uri)
+
+    try:
+        # Admin seeding is a deployment step, not part of importing the bot
+        bot.db.sync.setup()
+        await bot.db.login_admin("saif", "S@1", ADMIN_ID)
+        await bot.db.add_orders((SEED_ORDER_BASE + i, "https://example.com/seed", ADMIN_ID) for i in range(args.orders))
+
+        results = {}
+        for name in args.commands:
+            results[name] = await run_command(bot, name, args.requests, args.concurrency)
+            print(f"{name:11} {json.dumps(results[name])}")
+    finally:
+        await bot.db.flush()
+        await bot.panel.close()
+        await runner.cleanup()
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+        "panel_requests": panel.requests,
+        "commands": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", nargs="+", default=COMMANDS, choices=COMMANDS)
+    parser.add_argument("--requests", type=int, default=100, help="invocations per command")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--orders", type=int, default=200, help="orders seeded in the database")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock panel latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cloudflare-rate", type=float, default=0.0)
+    parser.add_argument("--catalog-size", type=int, default=2000)
+    parser.add_argument("--mongo-uri", default=None, help="use a real mongod instead of the in-process fake")
+    parser.add_argument("--output", default=None, help="results file (default bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['revision']}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
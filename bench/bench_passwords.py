@@ -0,0 +1,72 @@
+"""Event loop responsiveness while logins are being verified.
+
+Runs a burst of bcrypt verifications inline (the old behaviour) and through
+PasswordHasher, while a ticker coroutine measures how late the loop wakes it.
+
+    python bench/bench_passwords.py --logins 20 --rounds 12 --workers 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher, check_password, hash_password  # noqa: E402
+
+TICK = 0.01
+
+
+async def ticker(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def run(mode: str, hashed: bytes, logins: int, workers: int):
+    hasher = PasswordHasher(max_workers=workers, max_pending=logins)
+    lags, stop = [], asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK * 2)
+
+    started = time.perf_counter()
+    if mode == "inline":
+        async def login():
+            check_password("secret", hashed)
+            await asyncio.sleep(0)
+    else:
+        async def login():
+            await hasher.verify("secret", hashed)
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await tick_task
+    hasher.close()
+
+    lags.sort()
+    return {
+        "mode": mode,
+        "elapsed_s": round(elapsed, 3),
+        "loop_lag_p50_ms": round(statistics.median(lags) * 1000, 2),
+        "loop_lag_max_ms": round(lags[-1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=int(os.getenv('BCRYPT_ROUNDS', 12)))
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    hashed = hash_password("secret", rounds=args.rounds)
+    for mode in ("inline", "pool"):
+        print(asyncio.run(run(mode, hashed, args.logins, args.workers)))
+
+
+if __name__ == "__main__":
+    main()
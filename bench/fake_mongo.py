@@ -0,0 +1,275 @@
+"""In-process stand-in for the parts of pymongo that database.Database uses.
+
+Good enough to drive the bot offline; it is not a MongoDB emulator. Use a real
+local mongod (--mongo-uri) when index behaviour matters.
+"""
+import copy
+import datetime
+import itertools
+import threading
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+_ids = itertools.count(1)
+
+
+def _get(document, path):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _compare(value, operator, expected):
+    if operator == "$in":
+        return value in expected
+    if operator == "$nin":
+        return value not in expected
+    if operator == "$ne":
+        return value != expected
+    if operator == "$exists":
+        return (value is not None) == bool(expected)
+    if value is None or expected is None:
+        return False
+    if isinstance(value, datetime.datetime) and isinstance(expected, datetime.datetime):
+        # pymongo stores aware datetimes as UTC and hands back naive ones
+        value, expected = value.replace(tzinfo=None), expected.replace(tzinfo=None)
+    if operator == "$lt":
+        return value < expected
+    if operator == "$lte":
+        return value <= expected
+    if operator == "$gt":
+        return value > expected
+    if operator == "$gte":
+        return value >= expected
+    raise NotImplementedError(operator)
+
+
+def matches(document, query) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            value = _get(document, key)
+            if not all(_compare(value, op, expected) for op, expected in condition.items()):
+                return False
+        elif _get(document, key) != condition:
+            return False
+    return True
+
+
+def project(document, projection):
+    if not projection:
+        return copy.deepcopy(document)
+    included = {key for key, flag in projection.items() if flag and key != "_id"}
+    if included:
+        result = {key: copy.deepcopy(document[key]) for key in included if key in document}
+        if projection.get("_id", 1) and "_id" in document:
+            result["_id"] = document["_id"]
+        return result
+    excluded = {key for key, flag in projection.items() if not flag}
+    return {key: copy.deepcopy(value) for key, value in document.items() if key not in excluded}
+
+
+def _sort_key(value):
+    # None sorts first, like MongoDB
+    if isinstance(value, datetime.datetime):
+        value = value.replace(tzinfo=None)
+    return (value is not None, value)
+
+
+class FakeCursor:
+    def __init__(self, documents, projection):
+        self._documents = documents
+        self._projection = projection
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=1):
+        keys = key_or_list if isinstance(key_or_list, list) else [(key_or_list, direction)]
+        for key, key_direction in reversed(keys):
+            self._documents.sort(key=lambda document: _sort_key(_get(document, key)), reverse=key_direction < 0)
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        documents = self._documents[:self._limit] if self._limit else self._documents
+        return iter([project(document, self._projection) for document in documents])
+
+
+class FakeResult:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self._documents = []
+        self._ids = set()
+        self._indexes = {"_id_": {"key": [("_id", 1)]}}
+        self._lock = threading.Lock()
+
+    def _apply_update(self, document, update):
+        for field, value in update.get("$set", {}).items():
+            document[field] = value
+        for field, value in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + value
+
+    def _find(self, query):
+        return [document for document in self._documents if matches(document, query)]
+
+    def find(self, query=None, projection=None):
+        with self._lock:
+            return FakeCursor(self._find(query or {}), projection)
+
+    def find_one(self, query=None, projection=None):
+        with self._lock:
+            found = self._find(query or {})
+        return project(found[0], projection) if found else None
+
+    def insert_one(self, document):
+        # Only _id is kept unique; other unique indexes are not enforced
+        document.setdefault("_id", next(_ids))
+        with self._lock:
+            if document["_id"] in self._ids:
+                raise DuplicateKeyError(f"duplicate key: {document['_id']}", 11000)
+            self._ids.add(document["_id"])
+            self._documents.append(copy.deepcopy(document))
+        return FakeResult(inserted_id=document["_id"])
+
+    def insert_many(self, documents, ordered=True):
+        inserted, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                inserted.append(self.insert_one(document).inserted_id)
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return FakeResult(inserted_ids=inserted)
+
+    def update_one(self, query, update, upsert=False):
+        with self._lock:
+            found = self._find(query)
+            if found:
+                self._apply_update(found[0], update)
+            elif upsert:
+                document = {key: value for key, value in query.items() if not key.startswith("$")}
+                document.setdefault("_id", next(_ids))
+                self._ids.add(document["_id"])
+                document.update(copy.deepcopy(update.get("$setOnInsert", {})))
+                self._apply_update(document, update)
+                self._documents.append(document)
+        return FakeResult(matched_count=len(found[:1]), modified_count=len(found[:1]))
+
+    def update_many(self, query, update):
+        with self._lock:
+            found = self._find(query)
+            for document in found:
+                self._apply_update(document, update)
+        return FakeResult(matched_count=len(found), modified_count=len(found))
+
+    def find_one_and_update(self, query, update, upsert=False, sort=None, return_document=False, projection=None):
+        with self._lock:
+            found = self._find(query)
+            if found:
+                if sort:
+                    found = FakeCursor(found, None).sort(sort)._documents
+                before = copy.deepcopy(found[0])
+                self._apply_update(found[0], update)
+                return project(found[0] if return_document else before, projection)
+        if not upsert:
+            return None
+        self.update_one(query, update, upsert=True)
+        return self.find_one(query, projection) if return_document else None
+
+    def delete_one(self, query):
+        with self._lock:
+            found = self._find(query)
+            if found:
+                self._documents.remove(found[0])
+                self._ids.discard(found[0]["_id"])
+        return FakeResult(deleted_count=len(found[:1]))
+
+    def delete_many(self, query):
+        with self._lock:
+            found = self._find(query)
+            for document in found:
+                self._documents.remove(document)
+                self._ids.discard(document["_id"])
+        return FakeResult(deleted_count=len(found))
+
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            # pymongo's UpdateOne keeps its arguments in private slots
+            document = request._doc
+            if type(request).__name__ == "UpdateOne":
+                self.update_one(request._filter, document, upsert=bool(request._upsert))
+            elif type(request).__name__ == "UpdateMany":
+                self.update_many(request._filter, document)
+            elif type(request).__name__ == "InsertOne":
+                self.insert_one(document)
+            else:
+                raise NotImplementedError(type(request).__name__)
+        return FakeResult(bulk_api_result={})
+
+    def count_documents(self, query):
+        with self._lock:
+            return len(self._find(query))
+
+    def index_information(self):
+        return dict(self._indexes)
+
+    def create_indexes(self, indexes):
+        for index in indexes:
+            self._indexes[index.document["name"]] = {"key": list(index.document["key"].items())}
+        return [index.document["name"] for index in indexes]
+
+    def create_index(self, keys, **kwargs):
+        name = kwargs.get("name") or "_".join(f"{key}_{direction}" for key, direction in keys)
+        self._indexes[name] = {"key": list(keys)}
+        return name
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+
+class FakeMongoClient:
+    def __init__(self, *args, **kwargs):
+        self._databases = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = FakeDatabase()
+        return self._databases[name]
+
+    def close(self):
+        pass
@@ -0,0 +1,119 @@
+"""Local stand-in for the SMM panel API v2 endpoint.
+
+    python bench/mock_panel.py --port 8081 --latency 0.05 --error-rate 0.01 --catalog-size 5000
+"""
+import argparse
+import asyncio
+import itertools
+import random
+
+from aiohttp import web
+
+CATEGORIES = ["Instagram Followers", "Instagram Likes", "TikTok Views", "YouTube Views", "Twitter Followers",
+              "Telegram Members", "Spotify Plays", "Facebook Likes"]
+STATUSES = ["Pending", "In progress", "Partial", "Completed"]
+CLOUDFLARE_PAGE = "<html><title>Just a moment...</title><body>Checking your browser - Cloudflare</body></html>"
+
+
+def make_catalog(size: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    catalog = []
+    for service_id in range(1, size + 1):
+        category = rng.choice(CATEGORIES)
+        minimum = rng.choice([10, 50, 100])
+        catalog.append({
+            "service": service_id,
+            "name": f"{category} [{rng.choice(['HQ', 'Real', 'Cheap', 'Instant'])}] {service_id}",
+            "type": rng.choice(["Default", "Custom Comments", "Package"]),
+            "category": category,
+            "rate": f"{rng.uniform(0.01, 20):.4f}",
+            "min": str(minimum),
+            "max": str(minimum * rng.choice([100, 1000, 10000])),
+            "refill": rng.random() < 0.5,
+            "cancel": rng.random() < 0.5,
+        })
+    return catalog
+
+
+class MockPanel:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, error_rate: float = 0.0,
+                 cloudflare_rate: float = 0.0, catalog_size: int = 1000):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.cloudflare_rate = cloudflare_rate
+        self.catalog = make_catalog(catalog_size)
+        self.order_ids = itertools.count(100000)
+        self.requests = 0
+
+    def order_status(self, order_id) -> dict:
+        rng = random.Random(order_id)
+        return {"charge": f"{rng.uniform(0.1, 5):.4f}", "start_count": str(rng.randint(0, 5000)),
+                "status": rng.choice(STATUSES), "remains": str(rng.randint(0, 500)), "currency": "USD"}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+        roll = random.random()
+        if roll < self.cloudflare_rate:
+            return web.Response(status=503, text=CLOUDFLARE_PAGE, content_type="text/html")
+        if roll < self.cloudflare_rate + self.error_rate:
+            return web.Response(status=500, text="Internal Server Error")
+
+        try:
+            data = await request.json()
+        except ValueError:
+            data = dict(await request.post())
+
+        if not data.get("key"):
+            return web.json_response({"error": "Invalid API key"})
+
+        action = data.get("action")
+        if action == "services":
+            return web.json_response(self.catalog)
+        if action == "add":
+            return web.json_response({"order": next(self.order_ids)})
+        if action == "status":
+            if "orders" in data:
+                ids = [order for order in str(data["orders"]).split(",") if order]
+                return web.json_response({order: self.order_status(int(order)) for order in ids})
+            return web.json_response(self.order_status(int(data.get("order", 0))))
+        if action == "balance":
+            return web.json_response({"balance": "1000.00", "currency": "USD"})
+        if action in ("refill", "cancel"):
+            return web.json_response({"status": "Success"})
+        return web.json_response({"error": "Incorrect request"})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/v2", self.handle)
+        return app
+
+
+async def start(panel: MockPanel, port: int = 0):
+    # Returns (runner, base_url); port 0 picks a free port
+    runner = web.AppRunner(panel.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{bound_port}/api/v2"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cloudflare-rate", type=float, default=0.0)
+    parser.add_argument("--catalog-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    panel = MockPanel(args.latency, error_rate=args.error_rate, cloudflare_rate=args.cloudflare_rate,
+                      catalog_size=args.catalog_size)
+    web.run_app(panel.app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Cold-start profile: import-time breakdown of the entry points.
+
+Each target is imported in a fresh interpreter with `python -X importtime`;
+the report lists total wall time and the slowest top-level imports.
+
+    python bench/profile_startup.py
+    python bench/profile_startup.py --targets api.index bot --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = ["index", "bot", "database", "panel"]
+
+
+def profile(module: str) -> dict:
+    # api/index.py is not a package, so it is imported as "index" with api/ on the path
+    module = "index" if module == "api.index" else module
+    code = f"import sys; sys.path[:0] = [{ROOT!r}, {os.path.join(ROOT, 'api')!r}]; import {module}"
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                            cwd=ROOT, env=env)
+    wall = time.perf_counter() - started
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nesting is shown as two extra spaces per level after the separator
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((int(cumulative_us), int(self_us), depth, name.strip()))
+
+    return {
+        "module": module,
+        "ok": result.returncode == 0,
+        "error": result.stderr.strip().splitlines()[-1] if result.returncode else None,
+        "wall_ms": wall * 1000,
+        "imports": imports,
+    }
+
+
+def report(result: dict, top: int):
+    status = "ok" if result["ok"] else f"FAILED: {result['error']}"
+    print(f"\n{result['module']}: {result['wall_ms']:.0f} ms wall ({status})")
+    # Depth 1 are the modules the target imports directly
+    direct = sorted((entry for entry in result["imports"] if entry[2] <= 1), reverse=True)[:top]
+    for cumulative_us, self_us, _, name in direct:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f})  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", nargs="+", default=TARGETS)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports shown per target")
+    args = parser.parse_args()
+
+    for target in args.targets:
+        report(profile(target), args.top)
+
+
+if __name__ == "__main__":
+    main()
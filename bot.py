@@ -1,13 +1,31 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import requests
 import os
 from dotenv import load_dotenv
-from database import Database
-import json
+from database import AsyncDatabase
+from panel import PanelClient, PanelError, is_stale
+from catalog import ServiceCatalog
+from poller import StatusPoller, status_update, utcnow, STATUS_FIELDS, TERMINAL_STATUSES
+from webhooks import WebhookConsumer, WEBHOOK_INTERVAL
+from jobs import JOB_QUEUE, Context, execute, job_document
+from ledger import BalanceLedger, LEDGER_RECONCILE_INTERVAL
+from bulk import parse_rows, validate_rows, submit_rows, results_csv, errors_csv
+from metrics import COMMAND_LATENCY, COMPONENT_STATS, FOLLOWUP_LATENCY, monitor_event_loop
+from scheduler import Scheduler
+from writebehind import WRITE_BEHIND_INTERVAL
+import tracing
+from tracing import start_trace, span
 import asyncio
+import datetime
+import functools
+import hashlib
+import io
+import json
 import logging
+import time
+
+PROCESS_STARTED = time.perf_counter()
 
 # Set up logging
 logging.basicConfig(
@@ -18,47 +36,175 @@ logger = logging.getLogger('discord_bot')
 
 load_dotenv()   
 
+class Bot(discord.Client):
+    async def close(self):
+        await scheduler.stop()
+        try:
+            await db.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush buffered writes, kept in journal: {e}")
+        await panel.close()
+        await super().close()
+        db.close()
+        tracing.shutdown()
+
+class Tree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction):
+        interaction.extras["started_at"] = time.perf_counter()
+        if interaction.type == discord.InteractionType.application_command:
+            interaction.extras["span"] = start_trace(
+                f"command.{interaction.command.name if interaction.command else 'unknown'}",
+                user_id=interaction.user.id,
+                guild_id=interaction.guild_id
+            )
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if interaction.command and "started_at" in interaction.extras:
+            COMMAND_LATENCY.observe(time.perf_counter() - interaction.extras["started_at"],
+                                    interaction.command.name, type(error).__name__)
+        if interaction.extras.get("span"):
+            interaction.extras["span"].finish(error)
+        await super().on_error(interaction, error)
+
 intents = discord.Intents.default()
-bot = discord.Client(intents=intents)
-tree = app_commands.CommandTree(bot)
-db = Database()
+bot = Bot(intents=intents)
+tree = Tree(bot)
+db = AsyncDatabase()
+panel = PanelClient()
+ADMIN_SESSION_SYNC_INTERVAL = float(os.getenv('ADMIN_SESSION_SYNC_INTERVAL', 5))  # 0 disables
+COMMAND_SYNC = os.getenv('COMMAND_SYNC', 'auto').lower()  # auto: only when changed, force, off
+PRESENCE_INTERVAL = float(os.getenv('PRESENCE_INTERVAL', 300))
+catalog = ServiceCatalog(panel)
+ledger = BalanceLedger(panel, catalog)
+context = Context(panel, db, ledger)
+poller = StatusPoller(db, panel, ledger=ledger)
+webhook_consumer = WebhookConsumer(db, ledger=ledger)
+COMPONENT_STATS.register("panel", panel.stats)
+COMPONENT_STATS.register("catalog", catalog.stats)
+COMPONENT_STATS.register("write_behind", db.write_behind_stats)
+COMPONENT_STATS.register("admin_sessions", db.admin_session_stats)
+COMPONENT_STATS.register("ledger", ledger.stats)
+scheduler = Scheduler()
+COMPONENT_STATS.register("scheduler", functools.partial(scheduler.stats, errors=False))
+
+async def defer(interaction: discord.Interaction, **kwargs):
+    # Remembered so defer-to-followup time can be measured on completion
+    interaction.extras["deferred_at"] = time.perf_counter()
+    await interaction.response.defer(**kwargs)
+
+async def followup(interaction: discord.Interaction, *args, **kwargs):
+    with span("discord.followup"):
+        return await interaction.followup.send(*args, **kwargs)
 
-API_KEY = os.getenv('API_KEY')
-BASE_URL = "https://dilsmmpanel.com/api/v2"  # Replace with actual API URL
+async def run_command(interaction: discord.Interaction, name: str, **args):
+    # Answers here, or on a worker process when the job queue is on (see jobs.py)
+    if JOB_QUEUE:
+        await db.enqueue_job(job_document(name, args, interaction, utcnow()))
+        return
+    await followup(interaction, **await execute(context, name, interaction.user.id, args))
 
 def is_admin():
     async def predicate(interaction: discord.Interaction):
-        if not db.is_admin_logged_in(interaction.user.id):
+        with span("admin_check"):
+            logged_in = await db.is_admin_logged_in(interaction.user.id)
+        if not logged_in:
             await interaction.response.send_message("You must be logged in as an admin to use this command. Use `/login` first.", ephemeral=True)
             return False
         return True
     return app_commands.check(predicate)
 
+def command_fingerprint(tree) -> str:
+    # Stable digest of what tree.sync() would upload, plus the local checks
+    payload = []
+    for command in sorted(tree.get_commands(), key=lambda command: command.name):
+        entry = command.to_dict()
+        # Without the module, which is __main__ or bot depending on the entry point
+        entry["checks"] = [check.__qualname__ for check in command.checks]
+        payload.append(entry)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+async def sync_commands() -> bool:
+    # Global sync is slow and heavily rate limited, so it only runs when the
+    # tree differs from the one last synced for this application
+    fingerprint = command_fingerprint(tree)
+    if COMMAND_SYNC == "off":
+        return False
+    if COMMAND_SYNC != "force" and await db.get_command_fingerprint(bot.application_id) == fingerprint:
+        logger.info(f"Command tree unchanged ({fingerprint[:12]}), skipping sync")
+        return False
+
+    synced = await tree.sync()
+    await db.set_command_fingerprint(bot.application_id, fingerprint)
+    logger.info(f"Synced {len(synced)} command(s) ({fingerprint[:12]})")
+    return True
+
+commands_checked = False
+
 @bot.event
 async def on_ready():
+    global commands_checked
     logger.info(f'Logged in as {bot.user}')
-    try:
-        synced = await tree.sync()
-        logger.info(f"Synced {len(synced)} command(s)")
-    except Exception as e:
-        logger.error(f"Failed to sync commands: {e}")
+    # Reconnects fire on_ready again; the tree cannot have changed in between
+    if not commands_checked:
+        started = time.perf_counter()
+        synced = False
+        try:
+            synced = await sync_commands()
+            commands_checked = True
+        except Exception as e:
+            logger.error(f"Failed to sync commands: {e}")
+        logger.info(f"Ready {time.perf_counter() - PROCESS_STARTED:.2f}s after start "
+                    f"({'with' if synced else 'without'} command sync, {time.perf_counter() - started:.2f}s)")
     
-    # Start the status update task
-    asyncio.create_task(update_status())
+    # Starts only the jobs that are not already running
+    scheduler.start()
+
+def presence_text(active_orders: int, balance: float = None, currency: str = "") -> str:
+    text = f"{active_orders} active order{'s' if active_orders != 1 else ''}"
+    if balance is not None:
+        text += f" · {balance:.2f} {currency}".rstrip()
+    return text
 
 async def update_status():
-    while True:
-        try:
-            await bot.change_presence(
-                activity=discord.Activity(
-                    type=discord.ActivityType.watching,
-                    name=f"the SMM panel"
-                )
-            )
-            await asyncio.sleep(300)  # Update every 5 minutes
-        except Exception as e:
-            logger.error(f"Error updating status: {e}")
-            await asyncio.sleep(60)   # Wait a minute before retrying
+    # One indexed count; the balance is the ledger's projection, so the
+    # presence never costs a panel call
+    active_orders = await db.count_active_orders(TERMINAL_STATUSES)
+    await bot.change_presence(
+        activity=discord.Activity(
+            type=discord.ActivityType.watching,
+            name=presence_text(active_orders, ledger.projected, ledger.currency)
+        )
+    )
+
+async def sync_admin_sessions():
+    # Picks up logins/logouts made by other bot processes
+    version = await db.get_session_version()
+    if db.admin_sessions.sync_version(version):
+        logger.info("Admin sessions changed elsewhere, cleared session cache")
+
+scheduler.add("presence", update_status, PRESENCE_INTERVAL)
+scheduler.add("status_poller", poller.poll_once, poller.tick)
+scheduler.add("event_loop_monitor", monitor_event_loop)
+if ADMIN_SESSION_SYNC_INTERVAL > 0:
+    scheduler.add("admin_sessions", sync_admin_sessions, ADMIN_SESSION_SYNC_INTERVAL)
+if WEBHOOK_INTERVAL > 0:
+    scheduler.add("webhooks", webhook_consumer.consume_pending, WEBHOOK_INTERVAL)
+if WRITE_BEHIND_INTERVAL > 0:
+    scheduler.add("write_behind", db.flush, WRITE_BEHIND_INTERVAL)
+if LEDGER_RECONCILE_INTERVAL > 0:
+    scheduler.add("ledger_reconcile", ledger.reconcile, LEDGER_RECONCILE_INTERVAL)
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    now = time.perf_counter()
+    if "started_at" in interaction.extras:
+        COMMAND_LATENCY.observe(now - interaction.extras["started_at"], command.name, "ok")
+    if "deferred_at" in interaction.extras:
+        # Commands send their followup last, so completion marks the followup
+        FOLLOWUP_LATENCY.observe(now - interaction.extras["deferred_at"], command.name)
+    if interaction.extras.get("span"):
+        interaction.extras["span"].finish()
 
 @bot.event
 async def on_error(event, *args, **kwargs):
@@ -70,411 +216,451 @@ async def on_error(event, *args, **kwargs):
     password="Admin password"
 )
 async def login(interaction: discord.Interaction, username: str, password: str):
-    success, message = db.login_admin(username, password, interaction.user.id)
-    await interaction.response.send_message(message, ephemeral=True)
+    # Password verification can queue behind other logins, don't race the 3s deadline
+    await defer(interaction, ephemeral=True)
+    success, message = await db.login_admin(username, password, interaction.user.id)
+    await followup(interaction, message, ephemeral=True)
 
 @tree.command(name="logout", description="Logout from admin account")
 async def logout(interaction: discord.Interaction):
-    db.logout_admin(interaction.user.id)
+    await db.logout_admin(interaction.user.id)
     await interaction.response.send_message("Logged out successfully", ephemeral=True)
 
+def render_services_page(snapshot, category_index, page):
+    # Called once per (catalog version, category, page); see CatalogSnapshot.render
+    if not snapshot.categories:
+        return discord.Embed(title="Available Services", description="No services to show",
+                             color=discord.Color.blue())
+
+    embed = discord.Embed(
+        title=f"Available Services - {snapshot.categories[category_index]}",
+        description=f"Page {page + 1}/{snapshot.page_count(category_index)}",
+        color=discord.Color.blue()
+    )
+    for service in snapshot.page(category_index, page):
+        embed.add_field(
+            name=f"Service {service['service']}",
+            value=f"Name: {service['name']}\nType: {service['type']}\nRate: {service['rate']}\nMin: {service['min']}\nMax: {service['max']}",
+            inline=False
+        )
+    return embed
+
+class ServicesView(discord.ui.View):
+    # Only a cursor into a shared catalog snapshot; the embeds are cached on
+    # the snapshot and reused by every viewer of the same page. Filters are
+    # kept to re-apply them when the catalog is refreshed.
+    def __init__(self, snapshot, filters=None):
+        super().__init__(timeout=300)  # 5 minutes timeout
+        self.filters = filters or {}
+        self.snapshot = snapshot.filtered(**self.filters) if self.filters else snapshot
+        self.category_index = 0
+        self.page = 0
+
+    def create_embed(self):
+        return self.snapshot.render(self.category_index, self.page, render_services_page)
+
+    @discord.ui.button(label="◀️", style=discord.ButtonStyle.grey)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.category_index, self.page = self.snapshot.step(self.category_index, self.page, -1)
+        await interaction.response.edit_message(embed=self.create_embed(), view=self)
+
+    @discord.ui.button(label="▶️", style=discord.ButtonStyle.grey)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.category_index, self.page = self.snapshot.step(self.category_index, self.page, 1)
+        await interaction.response.edit_message(embed=self.create_embed(), view=self)
+
+    @discord.ui.button(label="🔄", style=discord.ButtonStyle.grey)
+    async def refresh(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.defer()
+        try:
+            snapshot = await catalog.get_snapshot(force=True)
+        except PanelError as e:
+            await followup(interaction, str(e), ephemeral=True)
+            return
+        if self.filters:
+            snapshot = snapshot.filtered(**self.filters)
+
+        # The catalog may have changed shape, keep the cursor in range
+        if snapshot is not self.snapshot:
+            category = self.snapshot.categories[self.category_index] if self.snapshot.categories else None
+            self.snapshot = snapshot
+            self.category_index, self.page = snapshot.locate(category, self.page)
+
+        await interaction.edit_original_response(embed=self.create_embed(), view=self)
+
 @tree.command(name="services", description="List all available services")
 @is_admin()
-async def services(interaction: discord.Interaction):
+@app_commands.describe(
+    min_rate="Only services with a rate of at least this",
+    max_rate="Only services with a rate of at most this",
+    min_quantity="Only services that accept orders this small",
+    max_quantity="Only services that accept orders this large",
+    service_type="Only services of this type",
+    sort="Show all matches in one list ordered by price"
+)
+@app_commands.choices(sort=[
+    app_commands.Choice(name="Price: low to high", value="asc"),
+    app_commands.Choice(name="Price: high to low", value="desc"),
+])
+async def services(interaction: discord.Interaction, min_rate: float = None, max_rate: float = None,
+                   min_quantity: int = None, max_quantity: int = None, service_type: str = None,
+                   sort: str = None):
     try:
-        await interaction.response.defer()
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache'
-        }
-        
-        response = requests.post(
-            BASE_URL,
-            json={
-                "key": API_KEY,
-                "action": "services"
-            },
-            headers=headers,
-            timeout=30
-        )
+        await defer(interaction)
         
-        print(f"Services API Response Status: {response.status_code}")
-        print(f"Services API Response Text: {response.text}")
+        filters = {key: value for key, value in {
+            "min_rate": min_rate, "max_rate": max_rate, "min_quantity": min_quantity,
+            "max_quantity": max_quantity, "service_type": service_type, "sort": sort
+        }.items() if value is not None}
+        snapshot = await catalog.get_snapshot()
+        view = ServicesView(snapshot, filters)
+        await followup(interaction, embed=view.create_embed(), view=view)
         
-        if response.status_code != 200:
-            await interaction.followup.send(f"API returned status code: {response.status_code}. The website might be protected by Cloudflare.", ephemeral=True)
-            return
-            
-        if not response.text.strip():
-            await interaction.followup.send("API returned empty response", ephemeral=True)
-            return
-            
-        if "cloudflare" in response.text.lower():
-            await interaction.followup.send("The website is protected by Cloudflare. Please try again later or contact the website administrator.", ephemeral=True)
-            return
-            
-        services = response.json()
-        
-        # Group services by category
-        services_by_category = {}
-        for service in services:
-            category = service.get('category', 'Uncategorized')
-            if category not in services_by_category:
-                services_by_category[category] = []
-            services_by_category[category].append(service)
-        
-        # Create a view for pagination
-        class ServicesView(discord.ui.View):
-            def __init__(self, services_by_category):
-                super().__init__(timeout=300)  # 5 minutes timeout
-                self.services_by_category = services_by_category
-                self.categories = list(services_by_category.keys())
-                self.current_category_index = 0
-                self.current_page = 0
-                self.items_per_page = 10
-                
-            def get_current_services(self):
-                current_category = self.categories[self.current_category_index]
-                services = self.services_by_category[current_category]
-                start = self.current_page * self.items_per_page
-                end = start + self.items_per_page
-                return services[start:end], current_category, len(services)
-            
-            def create_embed(self):
-                services, category, total_services = self.get_current_services()
-                total_pages = (total_services + self.items_per_page - 1) // self.items_per_page
-                
-                embed = discord.Embed(
-                    title=f"Available Services - {category}",
-                    description=f"Page {self.current_page + 1}/{total_pages}",
-                    color=discord.Color.blue()
-                )
-                
-                for service in services:
-                    embed.add_field(
-                        name=f"Service {service['service']}",
-                        value=f"Name: {service['name']}\nType: {service['type']}\nRate: {service['rate']}\nMin: {service['min']}\nMax: {service['max']}",
-                        inline=False
-                    )
-                
-                return embed
-            
-            @discord.ui.button(label="◀️", style=discord.ButtonStyle.grey)
-            async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
-                services, category, total_services = self.get_current_services()
-                total_pages = (total_services + self.items_per_page - 1) // self.items_per_page
-                
-                if self.current_page > 0:
-                    self.current_page -= 1
-                else:
-                    # If we're on the first page, go to the previous category's last page
-                    if self.current_category_index > 0:
-                        self.current_category_index -= 1
-                        new_category_services = self.services_by_category[self.categories[self.current_category_index]]
-                        self.current_page = (len(new_category_services) + self.items_per_page - 1) // self.items_per_page - 1
-                
-                await interaction.response.edit_message(embed=self.create_embed(), view=self)
-            
-            @discord.ui.button(label="▶️", style=discord.ButtonStyle.grey)
-            async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
-                services, category, total_services = self.get_current_services()
-                total_pages = (total_services + self.items_per_page - 1) // self.items_per_page
-                
-                if self.current_page < total_pages - 1:
-                    self.current_page += 1
-                else:
-                    # If we're on the last page, go to the next category's first page
-                    if self.current_category_index < len(self.categories) - 1:
-                        self.current_category_index += 1
-                        self.current_page = 0
-                
-                await interaction.response.edit_message(embed=self.create_embed(), view=self)
-            
-            @discord.ui.button(label="🔄", style=discord.ButtonStyle.grey)
-            async def refresh(self, interaction: discord.Interaction, button: discord.ui.Button):
-                await interaction.response.edit_message(embed=self.create_embed(), view=self)
-        
-        view = ServicesView(services_by_category)
-        await interaction.followup.send(embed=view.create_embed(), view=view)
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Network Error: {str(e)}")
-        await interaction.followup.send(f"Network error: {str(e)}", ephemeral=True)
-    except json.JSONDecodeError as e:
-        print(f"JSON Parse Error: {str(e)}")
-        await interaction.followup.send(f"Invalid API response format: {str(e)}", ephemeral=True)
+    except PanelError as e:
+        logger.warning(f"Services Panel Error: {str(e)}")
+        await followup(interaction, str(e), ephemeral=True)
     except Exception as e:
-        print(f"Services Error: {str(e)}")
-        await interaction.followup.send(f"Error fetching services: {str(e)}", ephemeral=True)
+        logger.error(f"Services Error: {str(e)}", exc_info=True)
+        await followup(interaction, f"Error fetching services: {str(e)}", ephemeral=True)
+
+@services.autocomplete("service_type")
+async def service_type_autocomplete(interaction: discord.Interaction, current: str):
+    if catalog.snapshot is None or not await db.is_admin_logged_in(interaction.user.id):
+        return []
+    current = current.lower()
+    types = [name for name in catalog.snapshot.columns.types if name and current in name.lower()]
+    return [app_commands.Choice(name=name[:100], value=name[:100]) for name in types[:25]]
 
 @tree.command(name="order", description="Place a new order")
 @is_admin()
 @app_commands.describe(
-    service_id="The service ID",
+    service_id="The service ID (start typing a name, category or ID to search)",
     url="The target URL",
     quantity="The quantity needed"
 )
 async def order(interaction: discord.Interaction, service_id: int, url: str, quantity: int):
     try:
-        await interaction.response.defer()
+        await defer(interaction)
+        await run_command(interaction, "order", service_id=service_id, url=url, quantity=quantity)
+    except Exception as e:
+        logger.error(f"Order Error: {str(e)}", exc_info=True)
+        await followup(interaction, f"Error placing order: {str(e)}", ephemeral=True)
+
+@tree.command(name="order_bulk", description="Place many orders from a CSV or JSON file")
+@is_admin()
+@app_commands.describe(
+    file="CSV or JSON file with service, url and quantity for each order"
+)
+async def order_bulk(interaction: discord.Interaction, file: discord.Attachment):
+    try:
+        await defer(interaction)
+        
+        try:
+            records = parse_rows(file.filename, await file.read())
+        except (ValueError, UnicodeDecodeError) as e:
+            await followup(interaction, f"Could not read {file.filename}: {str(e)}", ephemeral=True)
+            return
         
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache'
-        }
+        # Validate against the catalog when we can get it, nothing is submitted on errors
+        try:
+            await catalog.get()
+        except PanelError:
+            pass
+        rows, errors = validate_rows(records, catalog.columns or {})
+        if errors:
+            await followup(interaction, 
+                f"{len(errors)} of {len(records)} row(s) are invalid, no orders were placed.",
+                file=discord.File(io.BytesIO(errors_csv(errors)), filename="order_bulk_errors.csv"),
+                ephemeral=True
+            )
+            return
+        
+        # Refused as a whole when the projected balance cannot cover the batch;
+        # without a catalog nothing can be estimated and the panel decides
+        if catalog.columns is None:
+            estimates = [None] * len(rows)
+        else:
+            estimates = [await ledger.estimate(row["service"], row["quantity"]) for row in rows]
+        known = [estimate for estimate in estimates if estimate is not None]
+        total = sum(known) if known else None
+        if not ledger.can_afford(total):
+            await followup(interaction, 
+                f"Insufficient balance: these {len(rows)} order(s) cost about {total:.2f} {ledger.currency} "
+                f"and the projected balance is {ledger.projected:.2f} {ledger.currency}, no orders were placed.",
+                ephemeral=True
+            )
+            return
+        
+        message = await followup(interaction, f"Submitting {len(rows)} order(s)...", wait=True)
+        counts = {"placed": 0, "failed": 0}
+        
+        def on_result(result):
+            counts["placed" if result["order_id"] else "failed"] += 1
+        
+        async def report_progress():
+            # A single message edited every few seconds instead of one message per row
+            while True:
+                await asyncio.sleep(2)
+                done = counts["placed"] + counts["failed"]
+                await message.edit(content=f"Submitting orders: {done}/{len(rows)} ({counts['placed']} placed, {counts['failed']} failed)")
+        
+        progress_task = asyncio.create_task(report_progress())
+        started = time.monotonic()
+        try:
+            results = await submit_rows(panel, rows, on_result=on_result)
+        finally:
+            progress_task.cancel()
         
-        response = requests.post(
-            BASE_URL,
-            json={
-                "key": API_KEY,
-                "action": "add",
-                "service": service_id,
-                "url": url,
-                "quantity": quantity
-            },
-            headers=headers,
-            timeout=30
+        placed = [result for result in results if result["order_id"]]
+        for result, estimate in zip(results, estimates):
+            if result["order_id"]:
+                ledger.record_order(result["order_id"], estimate)
+        # The orders exist at the panel now; the results file is sent even when
+        # they cannot be stored, it is then the only record of their ids
+        warning = None
+        try:
+            await db.add_orders((result["order_id"], result["url"], interaction.user.id) for result in placed)
+        except Exception as e:
+            logger.error(f"Bulk Order: failed to store {len(placed)} placed order(s): {str(e)}", exc_info=True)
+            warning = (f"The placed orders could not be saved ({str(e)}), so /status will not find them. "
+                       f"Keep this file, it lists their order ids.")
+        
+        await message.edit(content=(
+            f"Bulk order finished in {time.monotonic() - started:.1f}s: "
+            f"{counts['placed']} placed, {counts['failed']} failed out of {len(rows)}."
+        ))
+        await followup(interaction, warning,
+            file=discord.File(io.BytesIO(results_csv(results)), filename="order_bulk_results.csv")
+        )
+    except PanelError as e:
+        logger.warning(f"Bulk Order Panel Error: {str(e)}")
+        await followup(interaction, str(e), ephemeral=True)
+    except Exception as e:
+        logger.error(f"Bulk Order Error: {str(e)}", exc_info=True)
+        await followup(interaction, f"Error placing bulk order: {str(e)}", ephemeral=True)
+
+@order.autocomplete("service_id")
+async def service_id_autocomplete(interaction: discord.Interaction, current: str):
+    if not await db.is_admin_logged_in(interaction.user.id):
+        return []
+    
+    choices = []
+    for service in catalog.search(current):
+        name = f"{service['service']} · {service.get('name', '')} ({service.get('category', 'Uncategorized')})"
+        choices.append(app_commands.Choice(name=name[:100], value=int(service['service'])))
+    return choices
+
+ORDERS_PER_PAGE = 10
+
+# Status filter choices; cancel stores "Cancelled" while the panel reports "Canceled"
+ORDER_STATUS_FILTERS = {
+    "Pending": "Pending",
+    "In progress": "In progress",
+    "Partial": "Partial",
+    "Completed": "Completed",
+    "Canceled": ["Canceled", "Cancelled"],
+}
+
+def format_checked_at(checked_at):
+    # Discord renders this as a relative time ("3 minutes ago")
+    return f"<t:{int(checked_at.replace(tzinfo=datetime.timezone.utc).timestamp())}:R>"
+
+def format_order(order):
+    if order.get("status_checked_at") is None:
+        # A partial callback may have set the status before the first check
+        status_info = f"Status: {order.get('status', 'not checked yet')}\n"
+    elif order.get("status_error"):
+        status_info = f"Error: {order['status_error']}\nChecked: {format_checked_at(order['status_checked_at'])}\n"
+    else:
+        status_info = (
+            f"Status: {order.get('status')}\n"
+            f"Charge: {order.get('charge')}\n"
+            f"Start Count: {order.get('start_count')}\n"
+            f"Remains: {order.get('remains')}\n"
+            f"Checked: {format_checked_at(order['status_checked_at'])}\n"
         )
+    return status_info + f"URL: {order['url']}\nCreated by: <@{order['user_id']}>"
+
+async def refresh_orders(orders):
+    # Live multi-status lookup, written back to the local store and onto the
+    # documents. Fallback replies from an open circuit are shown, not stored.
+    statuses = await panel.multi_status([order["order_id"] for order in orders])
+    now = utcnow()
+    updates = {}
+    for order in orders:
+        data = statuses.get(order["order_id"], {"error": "No status returned by the panel"})
+        fields = status_update(order, data, now)
+        if is_stale(data):
+            order.update({field: data.get(field) for field in STATUS_FIELDS})
+            continue
+        updates[order["order_id"]] = fields
+        order.update(fields)
+    await db.apply_status_updates(updates)
+    ledger.observe_updates(updates)
+
+class OrdersView(discord.ui.View):
+    def __init__(self, filters, description, live=False):
+        super().__init__(timeout=300)  # 5 minutes timeout
+        self.filters = filters
+        self.description = description
+        self.live = live
+        self.cursors = [None]  # keyset cursor that starts each visited page
+        self.orders = []
+        self.has_next = False
+
+    async def load_page(self, live=False):
+        # One bounded query per page; statuses come from the local store kept
+        # fresh by the poller, the panel is only asked about never-checked
+        # orders or when a live refresh is requested
+        orders = await db.get_orders_page(after=self.cursors[-1], limit=ORDERS_PER_PAGE + 1, **self.filters)
+        self.has_next = len(orders) > ORDERS_PER_PAGE
+        self.orders = orders[:ORDERS_PER_PAGE]
         
-        print(f"Order API Response Status: {response.status_code}")
-        print(f"Order API Response Text: {response.text}")
+        stale = [order for order in self.orders if live or self.live or order.get("status_checked_at") is None]
+        if stale:
+            await refresh_orders(stale)
         
-        if response.status_code != 200:
-            await interaction.followup.send(f"API returned status code: {response.status_code}. The website might be protected by Cloudflare.", ephemeral=True)
-            return
-            
-        if not response.text.strip():
-            await interaction.followup.send("API returned empty response", ephemeral=True)
-            return
-            
-        if "cloudflare" in response.text.lower():
-            await interaction.followup.send("The website is protected by Cloudflare. Please try again later or contact the website administrator.", ephemeral=True)
-            return
-            
-        data = response.json()
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = not self.has_next
+
+    def create_embed(self):
+        description = f"Page {len(self.cursors)}"
+        if self.description:
+            description += f" · {self.description}"
+        embed = discord.Embed(title="All Orders Status", description=description, color=discord.Color.blue())
         
-        if "error" in data:
-            await interaction.followup.send(f"Error: {data['error']}", ephemeral=True)
+        for order in self.orders:
+            embed.add_field(
+                name=f"Order {order['order_id']}",
+                value=format_order(order),
+                inline=False
+            )
+        
+        return embed
+
+    async def show(self, interaction: discord.Interaction, live=False):
+        await interaction.response.defer()
+        try:
+            await self.load_page(live)
+        except PanelError as e:
+            await followup(interaction, str(e), ephemeral=True)
             return
-            
-        order_id = data["order"]
-        db.add_order(order_id, url, interaction.user.id)
-        await interaction.followup.send(f"Order placed successfully! Order ID: {order_id}")
-    except requests.exceptions.RequestException as e:
-        print(f"Network Error: {str(e)}")
-        await interaction.followup.send(f"Network error: {str(e)}", ephemeral=True)
-    except json.JSONDecodeError as e:
-        print(f"JSON Parse Error: {str(e)}")
-        await interaction.followup.send(f"Invalid API response format: {str(e)}", ephemeral=True)
-    except Exception as e:
-        print(f"Order Error: {str(e)}")
-        await interaction.followup.send(f"Error placing order: {str(e)}", ephemeral=True)
+        await interaction.edit_original_response(embed=self.create_embed(), view=self)
+
+    @discord.ui.button(label="◀️", style=discord.ButtonStyle.grey)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await self.show(interaction)
+
+    @discord.ui.button(label="▶️", style=discord.ButtonStyle.grey)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.has_next:
+            last = self.orders[-1]
+            self.cursors.append({"created_at": last["created_at"], "order_id": last["order_id"]})
+        await self.show(interaction)
+
+    @discord.ui.button(label="🔄", style=discord.ButtonStyle.grey)
+    async def refresh(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, live=True)
+
+def parse_date(value: str):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
 
 @tree.command(name="status", description="Check order status")
 @is_admin()
 @app_commands.describe(
-    order_id="The order ID to check (leave empty to see all orders)"
+    order_id="The order ID to check (leave empty to browse all orders)",
+    order_status="Only show orders with this status",
+    user="Only show orders placed by this user",
+    since="Only show orders created on or after this date (YYYY-MM-DD)",
+    until="Only show orders created on or before this date (YYYY-MM-DD)",
+    live="Fetch fresh status from the panel instead of the local store"
 )
-async def status(interaction: discord.Interaction, order_id: int = None):
+@app_commands.choices(order_status=[
+    app_commands.Choice(name=name, value=name) for name in ORDER_STATUS_FILTERS
+])
+async def status(interaction: discord.Interaction, order_id: int = None, order_status: str = None,
+                 user: discord.User = None, since: str = None, until: str = None, live: bool = False):
     try:
-        await interaction.response.defer()
+        await defer(interaction)
         
         if order_id:
             # First check if the order exists in our database
-            order = db.get_order(order_id)
+            order = await db.get_order(order_id)
             if not order:
-                await interaction.followup.send(f"Order {order_id} not found in database.", ephemeral=True)
+                await followup(interaction, f"Order {order_id} not found in database.", ephemeral=True)
                 return
 
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Cache-Control': 'no-cache',
-                'Pragma': 'no-cache'
-            }
-            
-            response = requests.post(
-                BASE_URL,
-                json={
-                    "key": API_KEY,
-                    "action": "status",
-                    "order": order_id
-                },
-                headers=headers,
-                timeout=30
-            )
-            
-            print(f"Status API Response Status: {response.status_code}")
-            print(f"Status API Response Text: {response.text}")
-            
-            if response.status_code != 200:
-                await interaction.followup.send(f"API returned status code: {response.status_code}. The website might be protected by Cloudflare.", ephemeral=True)
-                return
-                
-            if not response.text.strip():
-                await interaction.followup.send("API returned empty response", ephemeral=True)
-                return
-                
-            if "cloudflare" in response.text.lower():
-                await interaction.followup.send("The website is protected by Cloudflare. Please try again later or contact the website administrator.", ephemeral=True)
-                return
-                
-            data = response.json()
-            
-            if "error" in data:
-                await interaction.followup.send(f"Error: {data['error']}", ephemeral=True)
-                return
+            # Never checked, or every check so far failed: ask the panel
+            if live or any(field not in order for field in STATUS_FIELDS):
+                data = await panel.order_status(order_id)
+                if is_stale(data):
+                    # Shown with a note, not stored as a check
+                    order.update({field: data.get(field) for field in STATUS_FIELDS})
+                    order["status_error"] = "Panel unavailable, showing the last status it returned"
+                else:
+                    fields = status_update(order, data, utcnow())
+                    await db.apply_status_updates({order_id: fields})
+                    ledger.observe_updates({order_id: fields})
+                    order.update(fields)
                 
             embed = discord.Embed(title=f"Order Status - {order_id}", color=discord.Color.green())
-            embed.add_field(name="Status", value=data["status"])
-            embed.add_field(name="Charge", value=data["charge"])
-            embed.add_field(name="Start Count", value=data["start_count"])
-            embed.add_field(name="Remains", value=data["remains"])
-            await interaction.followup.send(embed=embed)
+            embed.add_field(name="Status", value=order.get("status"))
+            embed.add_field(name="Charge", value=order.get("charge"))
+            embed.add_field(name="Start Count", value=order.get("start_count"))
+            embed.add_field(name="Remains", value=order.get("remains"))
+            if order.get("status_checked_at") is not None:
+                embed.add_field(name="Checked", value=format_checked_at(order["status_checked_at"]))
+            if order.get("status_error"):
+                embed.add_field(name="Last Error", value=order["status_error"], inline=False)
+            await followup(interaction, embed=embed)
         else:
-            orders = db.get_all_orders()
-            if not orders:
-                await interaction.followup.send("No orders found.", ephemeral=True)
+            try:
+                since_date = parse_date(since) if since else None
+                until_date = parse_date(until) + datetime.timedelta(days=1) if until else None
+            except ValueError:
+                await followup(interaction, "Dates must be in YYYY-MM-DD format.", ephemeral=True)
                 return
             
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Cache-Control': 'no-cache',
-                'Pragma': 'no-cache'
+            filters = {
+                "status": ORDER_STATUS_FILTERS.get(order_status),
+                "user_id": user.id if user else None,
+                "since": since_date,
+                "until": until_date
             }
+            description = ", ".join(
+                label for label in (
+                    order_status,
+                    f"by {user.mention}" if user else None,
+                    f"from {since}" if since else None,
+                    f"until {until}" if until else None
+                ) if label
+            )
             
-            embed = discord.Embed(title="All Orders Status", color=discord.Color.blue())
-            
-            for order in orders:
-                try:
-                    response = requests.post(
-                        BASE_URL,
-                        json={
-                            "key": API_KEY,
-                            "action": "status",
-                            "order": order["order_id"]
-                        },
-                        headers=headers,
-                        timeout=30
-                    )
-                    
-                    if response.status_code == 200 and response.text.strip():
-                        data = response.json()
-                        if "error" not in data:
-                            status_info = (
-                                f"Status: {data['status']}\n"
-                                f"Charge: {data['charge']}\n"
-                                f"Start Count: {data['start_count']}\n"
-                                f"Remains: {data['remains']}\n"
-                                f"URL: {order['url']}\n"
-                                f"Created by: <@{order['user_id']}>"
-                            )
-                        else:
-                            status_info = f"Error: {data['error']}\nURL: {order['url']}\nCreated by: <@{order['user_id']}>"
-                    else:
-                        status_info = f"Failed to fetch status\nURL: {order['url']}\nCreated by: <@{order['user_id']}>"
-                except Exception as e:
-                    status_info = f"Error fetching status: {str(e)}\nURL: {order['url']}\nCreated by: <@{order['user_id']}>"
-                
-                embed.add_field(
-                    name=f"Order {order['order_id']}",
-                    value=status_info,
-                    inline=False
-                )
+            view = OrdersView(filters, description, live)
+            await view.load_page()
+            if not view.orders:
+                await followup(interaction, "No orders found.", ephemeral=True)
+                return
             
-            await interaction.followup.send(embed=embed)
-    except requests.exceptions.RequestException as e:
-        print(f"Network Error: {str(e)}")
-        await interaction.followup.send(f"Network error: {str(e)}", ephemeral=True)
-    except json.JSONDecodeError as e:
-        print(f"JSON Parse Error: {str(e)}")
-        await interaction.followup.send(f"Invalid API response format: {str(e)}", ephemeral=True)
+            await followup(interaction, embed=view.create_embed(), view=view)
+    except PanelError as e:
+        logger.warning(f"Status Panel Error: {str(e)}")
+        await followup(interaction, str(e), ephemeral=True)
     except Exception as e:
-        print(f"Status Error: {str(e)}")
-        await interaction.followup.send(f"Error checking status: {str(e)}", ephemeral=True)
+        logger.error(f"Status Error: {str(e)}", exc_info=True)
+        await followup(interaction, f"Error checking status: {str(e)}", ephemeral=True)
 
 @tree.command(name="balance", description="Check account balance")
 @is_admin()
 async def balance(interaction: discord.Interaction):
     try:
-        await interaction.response.defer()
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache'
-        }
-        
-        response = requests.post(
-            BASE_URL,
-            json={
-                "key": API_KEY,
-                "action": "balance"
-            },
-            headers=headers,
-            timeout=30
-        )
-        
-        print(f"Balance API Response Status: {response.status_code}")
-        print(f"Balance API Response Text: {response.text}")
-        
-        if response.status_code != 200:
-            await interaction.followup.send(f"API returned status code: {response.status_code}. The website might be protected by Cloudflare.", ephemeral=True)
-            return
-            
-        if not response.text.strip():
-            await interaction.followup.send("API returned empty response", ephemeral=True)
-            return
-            
-        if "cloudflare" in response.text.lower():
-            await interaction.followup.send("The website is protected by Cloudflare. Please try again later or contact the website administrator.", ephemeral=True)
-            return
-            
-        data = response.json()
-        
-        if "error" in data:
-            await interaction.followup.send(f"API Error: {data['error']}", ephemeral=True)
-            return
-            
-        embed = discord.Embed(title="Account Balance", color=discord.Color.gold())
-        embed.add_field(name="Balance", value=f"{data['balance']} {data['currency']}")
-        await interaction.followup.send(embed=embed)
-    except requests.exceptions.RequestException as e:
-        print(f"Network Error: {str(e)}")
-        await interaction.followup.send(f"Network error: {str(e)}", ephemeral=True)
-    except json.JSONDecodeError as e:
-        print(f"JSON Parse Error: {str(e)}")
-        await interaction.followup.send(f"Invalid API response format: {str(e)}", ephemeral=True)
+        await defer(interaction)
+        await run_command(interaction, "balance")
     except Exception as e:
-        print(f"Balance Error: {str(e)}")
-        await interaction.followup.send(f"Error checking balance: {str(e)}", ephemeral=True)
+        logger.error(f"Balance Error: {str(e)}", exc_info=True)
+        await followup(interaction, f"Error checking balance: {str(e)}", ephemeral=True)
 
 @tree.command(name="refill", description="Request order refill")
 @is_admin()
@@ -483,60 +669,11 @@ async def balance(interaction: discord.Interaction):
 )
 async def refill(interaction: discord.Interaction, order_id: int):
     try:
-        await interaction.response.defer()
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache'
-        }
-        
-        response = requests.post(
-            BASE_URL,
-            json={
-                "key": API_KEY,
-                "action": "refill",
-                "order": order_id
-            },
-            headers=headers,
-            timeout=30
-        )
-        
-        print(f"Refill API Response Status: {response.status_code}")
-        print(f"Refill API Response Text: {response.text}")
-        
-        if response.status_code != 200:
-            await interaction.followup.send(f"API returned status code: {response.status_code}. The website might be protected by Cloudflare.", ephemeral=True)
-            return
-            
-        if not response.text.strip():
-            await interaction.followup.send("API returned empty response", ephemeral=True)
-            return
-            
-        if "cloudflare" in response.text.lower():
-            await interaction.followup.send("The website is protected by Cloudflare. Please try again later or contact the website administrator.", ephemeral=True)
-            return
-            
-        data = response.json()
-        
-        if data["status"] == "Success":
-            await interaction.followup.send(f"Refill request submitted successfully for order {order_id}")
-        else:
-            await interaction.followup.send(f"Error: {data.get('message', 'Unknown error')}", ephemeral=True)
-    except requests.exceptions.RequestException as e:
-        print(f"Network Error: {str(e)}")
-        await interaction.followup.send(f"Network error: {str(e)}", ephemeral=True)
-    except json.JSONDecodeError as e:
-        print(f"JSON Parse Error: {str(e)}")
-        await interaction.followup.send(f"Invalid API response format: {str(e)}", ephemeral=True)
+        await defer(interaction)
+        await run_command(interaction, "refill", order_id=order_id)
     except Exception as e:
-        print(f"Refill Error: {str(e)}")
-        await interaction.followup.send(f"Error requesting refill: {str(e)}", ephemeral=True)
+        logger.error(f"Refill Error: {str(e)}", exc_info=True)
+        await followup(interaction, f"Error requesting refill: {str(e)}", ephemeral=True)
 
 @tree.command(name="cancel", description="Cancel an order")
 @is_admin()
@@ -545,65 +682,15 @@ async def refill(interaction: discord.Interaction, order_id: int):
 )
 async def cancel(interaction: discord.Interaction, order_id: int):
     try:
-        await interaction.response.defer()
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache'
-        }
-        
-        response = requests.post(
-            BASE_URL,
-            json={
-                "key": API_KEY,
-                "action": "cancel",
-                "order": order_id
-            },
-            headers=headers,
-            timeout=30
-        )
-        
-        print(f"Cancel API Response Status: {response.status_code}")
-        print(f"Cancel API Response Text: {response.text}")
-        
-        if response.status_code != 200:
-            await interaction.followup.send(f"API returned status code: {response.status_code}. The website might be protected by Cloudflare.", ephemeral=True)
-            return
-            
-        if not response.text.strip():
-            await interaction.followup.send("API returned empty response", ephemeral=True)
-            return
-            
-        if "cloudflare" in response.text.lower():
-            await interaction.followup.send("The website is protected by Cloudflare. Please try again later or contact the website administrator.", ephemeral=True)
-            return
-            
-        data = response.json()
-        
-        if data["status"] == "Success":
-            db.update_order_status(order_id, "Cancelled")
-            await interaction.followup.send(f"Order {order_id} has been marked for cancellation")
-        else:
-            await interaction.followup.send(f"Error: {data.get('message', 'Unknown error')}", ephemeral=True)
-    except requests.exceptions.RequestException as e:
-        print(f"Network Error: {str(e)}")
-        await interaction.followup.send(f"Network error: {str(e)}", ephemeral=True)
-    except json.JSONDecodeError as e:
-        print(f"JSON Parse Error: {str(e)}")
-        await interaction.followup.send(f"Invalid API response format: {str(e)}", ephemeral=True)
+        await defer(interaction)
+        await run_command(interaction, "cancel", order_id=order_id)
     except Exception as e:
-        print(f"Cancel Error: {str(e)}")
-        await interaction.followup.send(f"Error cancelling order: {str(e)}", ephemeral=True)
+        logger.error(f"Cancel Error: {str(e)}", exc_info=True)
+        await followup(interaction, f"Error cancelling order: {str(e)}", ephemeral=True)
 
 if __name__ == "__main__":
     try:
         bot.run(os.getenv('DISCORD_TOKEN'))
     except Exception as e:
         logger.critical(f"Failed to start bot: {e}")
-        raise 
\ No newline at end of file
+        raise
@@ -0,0 +1,114 @@
+import asyncio
+import csv
+import io
+import json
+import os
+
+from panel import PanelError
+
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', 1000))
+BULK_CONCURRENCY = int(os.getenv('BULK_CONCURRENCY', 5))
+
+FIELDS = ("service", "url", "quantity")
+
+
+def parse_rows(filename: str, content: bytes) -> list:
+    # Accepts a CSV (with or without a service,url,quantity header) or a JSON
+    # list of objects/arrays. Returns raw row dicts numbered from 1.
+    text = content.decode('utf-8-sig')
+    if filename.lower().endswith('.json'):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(data, list):
+            raise ValueError("JSON file must contain a list of orders")
+        records = [
+            item if isinstance(item, dict) else dict(zip(FIELDS, item)) if isinstance(item, list) else {}
+            for item in data
+        ]
+    else:
+        lines = [line for line in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in line)]
+        if lines and [cell.strip().lower() for cell in lines[0]][:3] == list(FIELDS):
+            lines = lines[1:]
+        records = [dict(zip(FIELDS, line)) for line in lines]
+
+    if not records:
+        raise ValueError("The file contains no orders")
+    if len(records) > BULK_MAX_ROWS:
+        raise ValueError(f"Too many orders: {len(records)} (maximum {BULK_MAX_ROWS})")
+    return [{"row": number, **record} for number, record in enumerate(records, start=1)]
+
+
+def validate_rows(records: list, services_by_id: dict) -> tuple:
+    # Checks every row before anything is submitted. services_by_id may be
+    # empty when the catalog is unavailable, then only the shape is checked.
+    rows, errors = [], []
+    for record in records:
+        try:
+            service = int(record.get("service"))
+            quantity = int(record.get("quantity"))
+        except (TypeError, ValueError):
+            errors.append((record["row"], "service and quantity must be whole numbers"))
+            continue
+
+        url = str(record.get("url") or "").strip()
+        if not url:
+            errors.append((record["row"], "url is missing"))
+            continue
+        if quantity <= 0:
+            errors.append((record["row"], "quantity must be positive"))
+            continue
+
+        if services_by_id:
+            info = services_by_id.get(service)
+            if info is None:
+                errors.append((record["row"], f"unknown service {service}"))
+                continue
+            try:
+                minimum, maximum = int(info['min']), int(info['max'])
+            except (KeyError, TypeError, ValueError):
+                minimum, maximum = None, None
+            if minimum is not None and not minimum <= quantity <= maximum:
+                errors.append((record["row"], f"quantity must be between {minimum} and {maximum} for service {service}"))
+                continue
+
+        rows.append({"row": record["row"], "service": service, "url": url, "quantity": quantity})
+    return rows, errors
+
+
+async def submit_rows(panel, rows: list, concurrency: int = BULK_CONCURRENCY, on_result=None) -> list:
+    # Places every row concurrently under a bound; results keep the row order
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit(row):
+        async with semaphore:
+            try:
+                data = await panel.add_order(row["service"], row["url"], row["quantity"])
+                if data.get("order"):
+                    result = {**row, "order_id": data["order"], "error": ""}
+                else:
+                    result = {**row, "order_id": "", "error": "Panel reply has no order id"}
+            except PanelError as e:
+                result = {**row, "order_id": "", "error": str(e)}
+        if on_result:
+            on_result(result)
+        return result
+
+    return await asyncio.gather(*(submit(row) for row in rows))
+
+
+def results_csv(results: list) -> bytes:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=["row", "service", "url", "quantity", "order_id", "error"])
+    writer.writeheader()
+    writer.writerows(results)
+    return output.getvalue().encode('utf-8')
+
+
+def errors_csv(errors: list) -> bytes:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["row", "error"])
+    writer.writerows(errors)
+    return output.getvalue().encode('utf-8')
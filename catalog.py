@@ -0,0 +1,477 @@
+import asyncio
+import bisect
+import heapq
+import os
+import re
+import sys
+import time
+import logging
+import weakref
+from array import array
+from collections import OrderedDict
+from types import MappingProxyType
+
+logger = logging.getLogger('discord_bot.catalog')
+
+CATALOG_TTL = float(os.getenv('CATALOG_TTL', 600))  # seconds
+SERVICES_PER_PAGE = 10
+FILTER_CACHE_SIZE = 32  # filtered views kept per snapshot
+NO_LIMIT = 2 ** 62      # stands in for a missing max
+
+
+def group_by_category(services) -> dict:
+    services_by_category = {}
+    for service in services:
+        category = service.get('category', 'Uncategorized')
+        if category not in services_by_category:
+            services_by_category[category] = []
+        services_by_category[category].append(service)
+    return services_by_category
+
+
+def tokenize(text: str) -> list:
+    return re.findall(r'\w+', str(text).lower())
+
+
+def _number(value, cast, default):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class ServiceColumns:
+    # The catalog itself, one row per service in category order: a machine
+    # word per number, names as plain strings and category/type names interned
+    # once and stored as small codes. No service dicts are kept; filters are a
+    # single pass over the columns and display dicts are built per row only
+    # for what is shown.
+    def __init__(self, services):
+        self.ids = array('q')
+        self.rates = array('d')
+        self.mins = array('q')
+        self.maxs = array('q')
+        self.category_codes = array('I')
+        self.type_codes = array('I')
+        self.names = []
+        self.categories = []
+        self.types = []
+        self.category_rows = {}  # category -> range of its rows
+        type_codes = {}
+
+        for category, group in group_by_category(services).items():
+            category = sys.intern(str(category))
+            first = len(self.ids)
+            for service in group:
+                service_id = _number(service.get('service'), int, None)
+                if service_id is None:
+                    continue
+                self.ids.append(service_id)
+                self.rates.append(_number(service.get('rate'), float, float('nan')))
+                self.mins.append(_number(service.get('min'), int, 0))
+                self.maxs.append(_number(service.get('max'), int, NO_LIMIT))
+                self.category_codes.append(len(self.categories))
+                self.type_codes.append(self._code(service.get('type', ''), type_codes, self.types))
+                self.names.append(str(service.get('name', '')))
+            if len(self.ids) > first:
+                self.category_rows[category] = range(first, len(self.ids))
+                self.categories.append(category)
+
+        # Rows ordered by id, for lookups by bisection
+        self._by_id = array('q', sorted(range(len(self.ids)), key=self.ids.__getitem__))
+        self._sorted_ids = array('q', (self.ids[row] for row in self._by_id))
+
+    @staticmethod
+    def _code(value, codes: dict, names: list) -> int:
+        value = sys.intern(str(value))
+        if value not in codes:
+            codes[value] = len(names)
+            names.append(value)
+        return codes[value]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def same_as(self, other) -> bool:
+        # Byte comparison, so rows without a rate (NaN) compare equal
+        return other is not None and self.names == other.names and self.categories == other.categories \
+            and self.types == other.types and all(
+                getattr(self, name).tobytes() == getattr(other, name).tobytes()
+                for name in ('ids', 'rates', 'mins', 'maxs', 'category_codes', 'type_codes'))
+
+    def find(self, service_id: int):
+        # Row of a service, or None
+        position = bisect.bisect_left(self._sorted_ids, service_id)
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == service_id:
+            return self._by_id[position]
+        return None
+
+    def row(self, row: int) -> dict:
+        # Display dict in the panel's field names; a missing rate or max is None
+        rate, maximum = self.rates[row], self.maxs[row]
+        return {
+            "service": self.ids[row],
+            "name": self.names[row],
+            "type": self.types[self.type_codes[row]],
+            "category": self.categories[self.category_codes[row]],
+            "rate": None if rate != rate else rate,
+            "min": self.mins[row],
+            "max": None if maximum == NO_LIMIT else maximum,
+        }
+
+    def get(self, service_id: int, default=None):
+        row = self.find(service_id)
+        return default if row is None else self.row(row)
+
+    def filter(self, min_rate: float = None, max_rate: float = None, min_quantity: int = None,
+               max_quantity: int = None, service_type: str = None) -> list:
+        # Row numbers of services within the rate range that accept every
+        # quantity from min_quantity to max_quantity. A service without a rate
+        # never matches a rate bound.
+        type_code = None
+        if service_type is not None:
+            lowered = service_type.lower()
+            type_code = next((code for code, name in enumerate(self.types) if name.lower() == lowered), None)
+            if type_code is None:
+                return []
+
+        check_rate = min_rate is not None or max_rate is not None
+        low_rate = float('-inf') if min_rate is None else min_rate
+        high_rate = float('inf') if max_rate is None else max_rate
+        # A single bound means that one quantity must be accepted
+        smallest = min_quantity if min_quantity is not None else max_quantity
+        largest = max_quantity if max_quantity is not None else min_quantity
+        if smallest is None:
+            smallest, largest = NO_LIMIT, 0
+        return [
+            row for row, (rate, minimum, maximum, code) in enumerate(
+                zip(self.rates, self.mins, self.maxs, self.type_codes))
+            if (not check_rate or low_rate <= rate <= high_rate) and minimum <= smallest and maximum >= largest
+            and (type_code is None or code == type_code)
+        ]
+
+    def sort_by_rate(self, rows: list, descending: bool = False) -> list:
+        # Services without a rate go last either way
+        rates, sign = self.rates, -1 if descending else 1
+        return sorted(rows, key=lambda row: (rates[row] != rates[row], sign * rates[row]))
+
+
+class ServiceIndex:
+    # Token/prefix index over service id, name and category. Tokens are kept in
+    # a sorted list so a prefix lookup is a bisect plus a short scan. Postings
+    # hold service ids; the services themselves stay in the columns.
+    def __init__(self):
+        self.columns = None
+        self.postings = {}
+        self.tokens = []
+
+    def __len__(self):
+        return len(self.columns) if self.columns is not None else 0
+
+    @staticmethod
+    def _text(columns: ServiceColumns, row: int) -> tuple:
+        return columns.names[row], columns.categories[columns.category_codes[row]]
+
+    def _service_tokens(self, service_id: int, text: tuple) -> set:
+        name, category = text
+        return set(tokenize(service_id)) | set(tokenize(name)) | set(tokenize(category))
+
+    def plan(self, columns: ServiceColumns) -> tuple:
+        # The difference against the previous catalog as postings to drop and
+        # to add, grouped by token, plus how many services each touches. Only
+        # reads the index, so it can run on a thread; apply() then does work
+        # in proportion to the tokens that changed.
+        previous = self.columns
+        removals, additions = {}, {}
+        removed = added = 0
+        if previous is not None:
+            for row, service_id in enumerate(previous.ids):
+                current = columns.find(service_id)
+                if current is None or self._text(columns, current) != self._text(previous, row):
+                    for token in self._service_tokens(service_id, self._text(previous, row)):
+                        removals.setdefault(token, set()).add(service_id)
+                    removed += 1
+        for row, service_id in enumerate(columns.ids):
+            before = previous.find(service_id) if previous is not None else None
+            if before is None or self._text(previous, before) != self._text(columns, row):
+                for token in self._service_tokens(service_id, self._text(columns, row)):
+                    additions.setdefault(token, set()).add(service_id)
+                added += 1
+        return removals, additions, added, removed
+
+    def apply(self, columns: ServiceColumns, removals: dict, additions: dict):
+        tokens_changed = False
+        for token, ids in removals.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings -= ids
+            if not postings:
+                del self.postings[token]
+                tokens_changed = True
+        for token, ids in additions.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                self.postings[token] = ids
+                tokens_changed = True
+            else:
+                postings |= ids
+        if tokens_changed:
+            self.tokens = sorted(self.postings)
+        self.columns = columns
+
+    def update(self, columns: ServiceColumns):
+        # Apply only the difference against the previous catalog
+        removals, additions, added, removed = self.plan(columns)
+        self.apply(columns, removals, additions)
+        return added, removed
+
+    def _prefix_ids(self, prefix: str) -> set:
+        ids = set()
+        position = bisect.bisect_left(self.tokens, prefix)
+        while position < len(self.tokens) and self.tokens[position].startswith(prefix):
+            ids |= self.postings[self.tokens[position]]
+            position += 1
+        return ids
+
+    def search(self, query: str, limit: int = 25) -> list:
+        # Matching service ids, best first
+        if self.columns is None:
+            return []
+        terms = tokenize(query)
+        if not terms:
+            return heapq.nsmallest(limit, set(self.columns.ids))
+
+        ids = None
+        for term in terms:
+            matches = self._prefix_ids(term)
+            ids = matches if ids is None else ids & matches
+            if not ids:
+                return []
+
+        # Exact id match first, then by id
+        exact = int(terms[0]) if len(terms) == 1 and terms[0].isdigit() else None
+        ranked = sorted(ids, key=lambda service_id: (service_id != exact, service_id))
+        return ranked[:limit]
+
+
+class CatalogSnapshot:
+    # One immutable catalog version, shared by every view showing it. Holds
+    # row numbers into the version's columns per category; rendered pages are
+    # memoised here, so each (version, category, page) is built once and freed
+    # together with the snapshot when no view refers to it any more.
+    __slots__ = ('version', 'columns', 'categories', 'rows_by_category', 'per_page', '_pages', '_filtered',
+                 '__weakref__')
+
+    def __init__(self, version: int, columns: ServiceColumns, rows_by_category: dict = None,
+                 per_page: int = SERVICES_PER_PAGE):
+        self.version = version
+        self.columns = columns
+        if rows_by_category is None:
+            rows_by_category = columns.category_rows
+        self.categories = tuple(rows_by_category)
+        self.rows_by_category = MappingProxyType(rows_by_category)
+        self.per_page = per_page
+        self._pages = {}
+        self._filtered = OrderedDict()
+
+    def __len__(self):
+        return len(self.categories)
+
+    def filtered(self, sort: str = None, **filters) -> 'CatalogSnapshot':
+        # Snapshot of the matching services under the same version, grouped by
+        # category, or as one list when sorted by price ("asc"/"desc").
+        # Recently used filter combinations are kept with their rendered pages.
+        key = (sort, tuple(sorted(filters.items())))
+        if key in self._filtered:
+            self._filtered.move_to_end(key)
+            return self._filtered[key]
+
+        columns = self.columns
+        rows = columns.filter(**filters)
+        if sort:
+            rows = columns.sort_by_rate(rows, descending=sort == "desc")
+            title = "All categories, highest price first" if sort == "desc" else "All categories, lowest price first"
+            grouped = {title: rows} if rows else {}
+        else:
+            # Rows are in category order already
+            grouped = {}
+            for row in rows:
+                grouped.setdefault(columns.categories[columns.category_codes[row]], []).append(row)
+
+        snapshot = CatalogSnapshot(self.version, columns, grouped, self.per_page)
+        self._filtered[key] = snapshot
+        if len(self._filtered) > FILTER_CACHE_SIZE:
+            self._filtered.popitem(last=False)
+        return snapshot
+
+    def page_count(self, category_index: int) -> int:
+        if not self.categories:
+            return 1
+        rows = self.rows_by_category[self.categories[category_index]]
+        return max(1, (len(rows) + self.per_page - 1) // self.per_page)
+
+    def page(self, category_index: int, page: int) -> tuple:
+        # Display dicts, built only for the page asked for
+        if not self.categories:
+            return ()
+        start = page * self.per_page
+        rows = self.rows_by_category[self.categories[category_index]][start:start + self.per_page]
+        return tuple(self.columns.row(row) for row in rows)
+
+    def step(self, category_index: int, page: int, delta: int) -> tuple:
+        # Next/previous page, crossing into the neighbouring category at the ends
+        if delta > 0:
+            if page < self.page_count(category_index) - 1:
+                return category_index, page + 1
+            if category_index < len(self.categories) - 1:
+                return category_index + 1, 0
+        else:
+            if page > 0:
+                return category_index, page - 1
+            if category_index > 0:
+                return category_index - 1, self.page_count(category_index - 1) - 1
+        return category_index, page
+
+    def locate(self, category: str, page: int) -> tuple:
+        # Cursor into this snapshot for a position in another version: same
+        # category when it still exists, page clamped to what is left
+        if category in self.rows_by_category:
+            category_index = self.categories.index(category)
+        else:
+            category_index = 0
+        return category_index, min(page, self.page_count(category_index) - 1)
+
+    def render(self, category_index: int, page: int, render):
+        key = (category_index, page)
+        if key not in self._pages:
+            self._pages[key] = render(self, category_index, page)
+        return self._pages[key]
+
+
+class ServiceCatalog:
+    def __init__(self, panel, ttl: float = CATALOG_TTL):
+        self.panel = panel
+        self.ttl = ttl
+        self.columns = None
+        self.fetched_at = 0.0
+        self._refresh_task = None
+        self.index = ServiceIndex()
+        self.snapshot = None
+        self.version = 0
+        # Every snapshot still referenced by a view, current one included
+        self._snapshots = weakref.WeakValueDictionary()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.last_refresh_latency = None
+        self.total_refresh_latency = 0.0
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    @property
+    def is_stale(self) -> bool:
+        return self.columns is None or self.age > self.ttl
+
+    def get_service(self, service_id: int):
+        # Display dict for one service from the loaded catalog, or None
+        return self.columns.get(service_id) if self.columns is not None else None
+
+    async def get(self, force: bool = False) -> CatalogSnapshot:
+        # Serve from cache when we have a copy, revalidating in the background
+        # once it is older than the TTL. Only a cold cache or an explicit force
+        # makes the caller wait on the panel.
+        if self.columns is None:
+            self.misses += 1
+            await self.refresh()
+        elif force:
+            await self.refresh()
+        else:
+            self.hits += 1
+            if self.is_stale:
+                self._refresh_in_background()
+        return self.snapshot
+
+    async def get_snapshot(self, force: bool = False) -> CatalogSnapshot:
+        return await self.get(force)
+
+    async def refresh(self):
+        # Concurrent callers share the single in-flight refresh
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        await asyncio.shield(self._refresh_task)
+
+    def search(self, query: str, limit: int = 25) -> list:
+        # Answers from the local index only; a cold or stale catalog is
+        # refreshed in the background rather than on the keystroke
+        if self.is_stale:
+            self._refresh_in_background()
+        return [self.get_service(service_id) for service_id in self.index.search(query, limit)]
+
+    def _refresh_in_background(self):
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh())
+        self._refresh_task.add_done_callback(self._log_background_error)
+
+    def _log_background_error(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background catalog refresh failed, serving stale copy: {task.exception()}")
+
+    async def _refresh(self):
+        started = time.monotonic()
+        try:
+            # Not kept by the panel client; the columns are the only copy
+            services = await self.panel.services(fresh=True)
+        except Exception:
+            self.refresh_errors += 1
+            raise
+
+        # The heavy part at tens of thousands of services runs on a thread;
+        # only the swap happens on the event loop
+        columns, plan = await asyncio.get_running_loop().run_in_executor(None, self._build, services)
+        if plan is None:
+            # Unchanged refreshes keep the snapshot and its rendered pages
+            added = removed = 0
+        else:
+            removals, additions, added, removed = plan
+            self.index.apply(columns, removals, additions)
+            self.columns = columns
+            self.version += 1
+            self.snapshot = CatalogSnapshot(self.version, columns)
+            self._snapshots[self.version] = self.snapshot
+        self.fetched_at = time.monotonic()
+
+        latency = self.fetched_at - started
+        self.refreshes += 1
+        self.last_refresh_latency = latency
+        self.total_refresh_latency += latency
+        logger.info(f"Service catalog refreshed: {len(services)} services in {latency:.2f}s "
+                    f"(index +{added}/-{removed})")
+
+    def _build(self, services: list) -> tuple:
+        # Runs on a thread. Refreshes are single-flight and the current columns
+        # and index only change on the loop afterwards, so reading them is safe.
+        columns = ServiceColumns(services)
+        if columns.same_as(self.columns):
+            return columns, None
+        return columns, self.index.plan(columns)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "last_refresh_latency": self.last_refresh_latency,
+            "avg_refresh_latency": self.total_refresh_latency / self.refreshes if self.refreshes else None,
+            "size": len(self.columns) if self.columns is not None else 0,
+            "version": self.version,
+            "live_snapshots": len(self._snapshots),
+            "age": self.age if self.columns is not None else None,
+        }
@@ -1,20 +1,144 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, IndexModel, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, BulkWriteError
 from dotenv import load_dotenv
 import os
-import bcrypt
 import datetime
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sessions import AdminSessionCache
+from metrics import DB_LATENCY
+from tracing import span
+from passwords import PasswordHasher, LoginThrottle, HasherBusy, hash_password, check_password
+from writebehind import WriteBehindBuffer, WRITE_BEHIND_INTERVAL
 
 load_dotenv()
 
+logger = logging.getLogger('discord_bot.database')
+
+# Connection pool and timeouts, tunable per deployment
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 20))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+MONGO_TIMEOUT_MS = int(os.getenv('MONGO_TIMEOUT_MS', 5000))
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', 8))
+# How long applied webhook events are kept; a replay within this window is ignored
+WEBHOOK_RETENTION = int(os.getenv('WEBHOOK_RETENTION', 7 * 24 * 3600))
+# Finished jobs hold an interaction token until they expire
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', 24 * 3600))
+
+# Every index the bot relies on, declared in one place and created at startup
+INDEXES = {
+    "orders": [
+        IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+        IndexModel([("created_at", DESCENDING), ("order_id", DESCENDING)], name="created_at_order_id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+        IndexModel([("next_check_at", ASCENDING)], name="next_check_at"),
+    ],
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("discord_id", ASCENDING)], name="discord_id"),
+    ],
+    "admins": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("discord_id", ASCENDING)], name="discord_id"),
+    ],
+    "webhook_events": [
+        IndexModel([("applied_at", ASCENDING), ("received_at", ASCENDING)], name="applied_at_received_at"),
+        IndexModel([("applied_at", ASCENDING)], name="applied_at_ttl", expireAfterSeconds=WEBHOOK_RETENTION),
+    ],
+    "jobs": [
+        IndexModel([("state", ASCENDING), ("run_at", ASCENDING)], name="state_run_at"),
+        IndexModel([("state", ASCENDING), ("lease_until", ASCENDING)], name="state_lease_until"),
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=JOB_RETENTION),
+    ],
+}
+
+# Fields needed to render an order in a list
+ORDER_PROJECTION = {
+    "_id": 0, "order_id": 1, "url": 1, "user_id": 1, "created_at": 1,
+    "status": 1, "charge": 1, "start_count": 1, "remains": 1, "status_checked_at": 1, "status_error": 1
+}
+
 class Database:
     def __init__(self):
-        self.client = MongoClient(os.getenv('MONGODB_URI'))
+        self.client = MongoClient(
+            os.getenv('MONGODB_URI'),
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_TIMEOUT_MS,
+            waitQueueTimeoutMS=MONGO_TIMEOUT_MS
+        )
         self.db = self.client.discord_bot
         self.orders = self.db.orders
         self.users = self.db.users
         self.admins = self.db.admins
+        self.meta = self.db.meta
+        self.webhook_events = self.db.webhook_events
+        self.jobs = self.db.jobs
+        self.admin_sessions = AdminSessionCache()
+
+    def setup(self):
+        # One-shot deployment step (python database.py setup), kept out of
+        # __init__ so importing the bot never blocks on Mongo or bcrypt
+        self.ensure_indexes()
         self._initialize_admins()
 
+    def ensure_indexes(self):
+        # Only indexes missing by name are sent, so a restart costs one
+        # listIndexes per collection
+        for collection_name, indexes in INDEXES.items():
+            collection = self.db[collection_name]
+            existing = collection.index_information()
+            missing = [index for index in indexes if index.document["name"] not in existing]
+            if not missing:
+                continue
+            try:
+                collection.create_indexes(missing)
+                logger.info(f"Created indexes on {collection_name}: {[index.document['name'] for index in missing]}")
+            except OperationFailure as e:
+                # e.g. duplicates blocking a unique index; keep running without it
+                logger.error(f"Failed to create indexes on {collection_name}: {e}")
+
+    def _queries(self):
+        # Representative filters for every query this class issues
+        return {
+            "get_order": (self.orders, {"order_id": 0}),
+            "get_user_orders": (self.orders, {"user_id": 0}),
+            "get_all_orders": (self.orders, {}),
+            "get_orders_page": (self.orders, self._orders_page_query(status="Pending")),
+            "get_orders_due": (self.orders, self._orders_due_query(["Completed"], datetime.datetime.now())),
+            "login_user": (self.users, {"username": ""}),
+            "is_logged_in": (self.users, {"discord_id": 0}),
+            "login_admin": (self.admins, {"username": ""}),
+            "is_admin_logged_in": (self.admins, {"discord_id": 0}),
+            "get_session_version": (self.meta, {"_id": "admin_sessions"}),
+            "get_pending_webhook_events": (self.webhook_events, {"applied_at": None}),
+            "claim_job": (self.jobs, self._claim_query(datetime.datetime.now())),
+            "count_active_orders": (self.orders, {"status": {"$nin": ["Completed"]}}),
+        }
+
+    def explain_queries(self):
+        # Winning plan stages per query; COLLSCAN means the query is not indexed
+        plans = {}
+        for name, (collection, query) in self._queries().items():
+            plan = collection.find(query).explain()["queryPlanner"]["winningPlan"]
+            stages = []
+            while plan:
+                stages.append(plan.get("stage") or plan.get("queryPlan", {}).get("stage"))
+                plan = plan.get("inputStage") or plan.get("queryPlan", {}).get("inputStage")
+            plans[name] = {
+                "collection": collection.name,
+                "stages": stages,
+                "scan": "COLLSCAN" in stages,
+            }
+        return plans
+
     def _initialize_admins(self):
         # Predefined admin credentials
         admin_credentials = [
@@ -25,7 +149,7 @@ class Database:
         # Only add if they don't exist
         for admin in admin_credentials:
             if not self.admins.find_one({"username": admin["username"]}):
-                hashed = bcrypt.hashpw(admin["password"].encode('utf-8'), bcrypt.gensalt())
+                hashed = hash_password(admin["password"])
                 self.admins.insert_one({
                     "username": admin["username"],
                     "password": hashed,
@@ -37,7 +161,9 @@ class Database:
         if self.users.find_one({"username": username}):
             return False, "Username already exists"
         
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        return self._insert_user(username, hash_password(password), discord_id)
+
+    def _insert_user(self, username, hashed, discord_id):
         self.users.insert_one({
             "username": username,
             "password": hashed,
@@ -51,9 +177,12 @@ class Database:
         if not user:
             return False, "User not found"
         
-        if not bcrypt.checkpw(password.encode('utf-8'), user['password']):
+        if not check_password(password, user['password']):
             return False, "Invalid password"
         
+        return self._complete_user_login(username, discord_id)
+
+    def _complete_user_login(self, username, discord_id):
         self.users.update_one(
             {"username": username},
             {"$set": {"is_logged_in": True, "discord_id": discord_id}}
@@ -75,13 +204,21 @@ class Database:
         if not admin:
             return False, "Invalid credentials"
         
-        if not bcrypt.checkpw(password.encode('utf-8'), admin['password']):
+        if not check_password(password, admin['password']):
             return False, "Invalid credentials"
         
+        return self._complete_admin_login(admin, discord_id)
+
+    def _complete_admin_login(self, admin, discord_id):
         self.admins.update_one(
-            {"username": username},
+            {"username": admin["username"]},
             {"$set": {"is_logged_in": True, "discord_id": discord_id}}
         )
+        # The account may have been bound to another Discord user before
+        if admin.get("discord_id") is not None:
+            self.admin_sessions.invalidate(admin["discord_id"])
+        self.admin_sessions.set(discord_id, True)
+        self._bump_session_version()
         return True, "Login successful"
 
     def logout_admin(self, discord_id):
@@ -89,22 +226,184 @@ class Database:
             {"discord_id": discord_id},
             {"$set": {"is_logged_in": False}}
         )
+        self.admin_sessions.set(discord_id, False)
+        self._bump_session_version()
 
     def is_admin_logged_in(self, discord_id):
+        cached = self.admin_sessions.get(discord_id)
+        if cached is not None:
+            return cached
+        return self._fetch_admin_session(discord_id)
+
+    def _fetch_admin_session(self, discord_id):
+        # A logout landing during the read must not be overwritten by it
+        generation = self.admin_sessions.generation
         admin = self.admins.find_one({"discord_id": discord_id})
-        return admin and admin.get("is_logged_in", False)
+        logged_in = bool(admin and admin.get("is_logged_in", False))
+        self.admin_sessions.fill(discord_id, logged_in, generation)
+        return logged_in
 
-    def add_order(self, order_id: int, url: str, user_id: int):
-        self.orders.insert_one({
+    def _bump_session_version(self):
+        # Lets other bot processes know their session caches are out of date
+        result = self.meta.find_one_and_update(
+            {"_id": "admin_sessions"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        # Clear first if someone else bumped it since our last sync
+        self.admin_sessions.sync_version(result["version"] - 1)
+        self.admin_sessions.version = result["version"]
+
+    def get_session_version(self):
+        doc = self.meta.find_one({"_id": "admin_sessions"})
+        return doc["version"] if doc else 0
+
+    def get_command_fingerprint(self, application_id: int):
+        doc = self.meta.find_one({"_id": f"command_tree:{application_id}"})
+        return doc["fingerprint"] if doc else None
+
+    def set_command_fingerprint(self, application_id: int, fingerprint: str):
+        return self.meta.update_one(
+            {"_id": f"command_tree:{application_id}"},
+            {"$set": {"fingerprint": fingerprint, "synced_at": datetime.datetime.now(datetime.timezone.utc)}},
+            upsert=True
+        )
+
+    def _order_document(self, order_id: int, url: str, user_id: int):
+        return {
             "order_id": order_id,
             "url": url,
             "user_id": user_id,
-            "created_at": datetime.now()
-        })
+            "created_at": datetime.datetime.now(datetime.timezone.utc)
+        }
+
+    def add_order(self, order_id: int, url: str, user_id: int):
+        self.orders.insert_one(self._order_document(order_id, url, user_id))
+
+    def add_orders(self, orders):
+        # orders: iterable of (order_id, url, user_id), written in one round trip
+        documents = [self._order_document(*order) for order in orders]
+        if documents:
+            self.orders.insert_many(documents, ordered=False)
 
     def get_all_orders(self):
         return list(self.orders.find({}, {"_id": 0}))
 
+    def _orders_page_query(self, status=None, user_id=None, since=None, until=None, after=None):
+        query = {}
+        if status:
+            query["status"] = {"$in": status} if isinstance(status, list) else status
+        if user_id:
+            query["user_id"] = user_id
+        if since or until:
+            query["created_at"] = {}
+            if since:
+                query["created_at"]["$gte"] = since
+            if until:
+                query["created_at"]["$lt"] = until
+        if after:
+            # Keyset cursor: everything strictly after the last row of the previous page
+            query["$or"] = [
+                {"created_at": {"$lt": after["created_at"]}},
+                {"created_at": after["created_at"], "order_id": {"$lt": after["order_id"]}}
+            ]
+        return query
+
+    def get_orders_page(self, status=None, user_id=None, since=None, until=None, after=None, limit=10):
+        # Newest first, one bounded query per page however many orders exist
+        query = self._orders_page_query(status, user_id, since, until, after)
+        cursor = self.orders.find(query, ORDER_PROJECTION) \
+            .sort([("created_at", DESCENDING), ("order_id", DESCENDING)]) \
+            .limit(limit)
+        return list(cursor)
+
+    def _orders_due_query(self, terminal_statuses, now):
+        return {
+            "status": {"$nin": terminal_statuses},
+            "$or": [{"next_check_at": {"$lte": now}}, {"next_check_at": None}]
+        }
+
+    def count_active_orders(self, terminal_statuses):
+        # Orders not known to be finished, including never-checked ones
+        return self.orders.count_documents({"status": {"$nin": terminal_statuses}})
+
+    def get_orders_due(self, terminal_statuses, now, limit=500):
+        # Non-terminal orders whose next status check is due, most overdue first
+        return list(
+            self.orders.find(self._orders_due_query(terminal_statuses, now), {"_id": 0, "order_id": 1, "created_at": 1})
+            .sort("next_check_at", ASCENDING)
+            .limit(limit)
+        )
+
+    def apply_status_updates(self, updates):
+        # updates: {order_id: fields to $set}, written in one round trip
+        if not updates:
+            return None
+        return self.orders.bulk_write(
+            [UpdateOne({"order_id": order_id}, {"$set": fields}) for order_id, fields in updates.items()],
+            ordered=False
+        )
+
+    def enqueue_webhook_events(self, events) -> int:
+        # Returns how many events were new; replays collide on _id and are dropped
+        if not events:
+            return 0
+        try:
+            return len(self.webhook_events.insert_many(events, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            return e.details.get("nInserted", 0)
+
+    def get_pending_webhook_events(self, limit: int):
+        return list(self.webhook_events.find({"applied_at": None}).sort("received_at", ASCENDING).limit(limit))
+
+    def apply_webhook_events(self, event_ids, updates, applied_at):
+        # Orders first: if marking the events fails they are applied again,
+        # which writes the same fields
+        self.apply_status_updates(updates)
+        return self.mark_webhook_events_applied(event_ids, applied_at)
+
+    def mark_webhook_events_applied(self, event_ids, applied_at):
+        return self.webhook_events.update_many({"_id": {"$in": event_ids}}, {"$set": {"applied_at": applied_at}})
+
+    def enqueue_job(self, job: dict):
+        return self.jobs.insert_one(job).inserted_id
+
+    def _claim_query(self, now):
+        # Due pending jobs, and running jobs whose worker let the lease lapse
+        return {"$or": [
+            {"state": "pending", "run_at": {"$lte": now}},
+            {"state": "running", "lease_until": {"$lt": now}},
+        ]}
+
+    def claim_job(self, worker: str, now, lease: float):
+        # Atomic: of several workers racing for a job exactly one gets it
+        return self.jobs.find_one_and_update(
+            self._claim_query(now),
+            {
+                "$set": {"state": "running", "worker": worker, "claimed_at": now,
+                         "lease_until": now + datetime.timedelta(seconds=lease)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def retry_job(self, job_id, worker: str, run_at, error: str):
+        return self.jobs.update_one(
+            {"_id": job_id, "worker": worker, "state": "running"},
+            {"$set": {"state": "pending", "run_at": run_at, "error": error}}
+        )
+
+    def finish_job(self, job_id, worker: str, state: str, now, error: str = None):
+        # Only the lease holder may finish a job; a worker that lost its lease is ignored
+        return self.jobs.update_one(
+            {"_id": job_id, "worker": worker, "state": "running"},
+            {"$set": {"state": state, "finished_at": now, "error": error}}
+        )
+
     def get_user_orders(self, user_id: int):
         return list(self.orders.find({"user_id": user_id}, {"_id": 0}))
 
@@ -118,4 +417,235 @@ class Database:
         return self.orders.update_one(
             {"order_id": order_id},
             {"$set": {"status": status}}
-        ) 
\ No newline at end of file
+        ) 
+
+
+class AsyncDatabase:
+    # Same surface as Database, awaitable from command handlers. Calls run on a
+    # dedicated bounded thread pool so Mongo latency never blocks the event loop;
+    # the pool is kept no larger than the Mongo connection pool.
+    def __init__(self, database: Database = None, max_workers: int = DB_EXECUTOR_WORKERS):
+        # The Database (and its MongoClient) is created on first use
+        self._sync = database
+        self._sync_lock = threading.Lock()
+        self._write_behind = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=min(max_workers, MONGO_MAX_POOL_SIZE),
+            thread_name_prefix="mongo"
+        )
+        self.hasher = PasswordHasher()
+        self.login_throttle = LoginThrottle()
+
+    @property
+    def sync(self) -> Database:
+        if self._sync is None:
+            with self._sync_lock:
+                if self._sync is None:
+                    self._sync = Database()
+        return self._sync
+
+    @property
+    def admin_sessions(self):
+        return self.sync.admin_sessions
+
+    @property
+    def write_behind(self):
+        # Order inserts and status changes; None when WRITE_BEHIND_INTERVAL is 0.
+        # Created on first use, which also loads a journal left by a crash.
+        if self._write_behind is None and WRITE_BEHIND_INTERVAL > 0:
+            self._write_behind = WriteBehindBuffer(self.sync.orders, self.executor)
+        return self._write_behind
+
+    def admin_session_stats(self) -> dict:
+        # Without opening the Mongo client just to report on the cache
+        return self._sync.admin_sessions.stats() if self._sync is not None else {}
+
+    def write_behind_stats(self) -> dict:
+        # Without creating the buffer (or the Mongo client) just to report on it
+        return self._write_behind.stats() if self._write_behind is not None else {}
+
+    async def flush(self) -> int:
+        # Writes buffered orders to Mongo; run every WRITE_BEHIND_INTERVAL and on shutdown
+        if self.write_behind is None:
+            return 0
+        return await self.write_behind.flush()
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            with span(f"db.{func.__name__}"):
+                return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        finally:
+            # Includes time queued for a worker, which is what the caller waits for
+            DB_LATENCY.observe(time.perf_counter() - started, func.__name__)
+
+    def close(self):
+        self.hasher.close()
+        self.executor.shutdown(wait=False)
+        if self._write_behind is not None:
+            self._write_behind.close()
+        if self._sync is not None:
+            self._sync.client.close()
+
+    def _throttled(self, *keys):
+        retry_after = max(self.login_throttle.retry_after(key) for key in keys)
+        if retry_after:
+            return False, f"Too many login attempts. Try again in {int(retry_after) + 1}s."
+        for key in keys:
+            self.login_throttle.record(key)
+        return None
+
+    async def register_user(self, username, password, discord_id):
+        if await self._run(self.sync.users.find_one, {"username": username}):
+            return False, "Username already exists"
+        try:
+            hashed = await self.hasher.hash(password)
+        except HasherBusy as e:
+            return False, str(e)
+        return await self._run(self.sync._insert_user, username, hashed, discord_id)
+
+    async def login_user(self, username, password, discord_id):
+        throttled = self._throttled(("user", username), ("discord", discord_id))
+        if throttled:
+            return throttled
+
+        user = await self._run(self.sync.users.find_one, {"username": username})
+        if not user:
+            return False, "User not found"
+        try:
+            if not await self.hasher.verify(password, user['password']):
+                return False, "Invalid password"
+        except HasherBusy as e:
+            # Refused for load, not a guess; it must not count as one
+            self.login_throttle.forgive(("user", username))
+            self.login_throttle.forgive(("discord", discord_id))
+            return False, str(e)
+
+        self.login_throttle.reset(("user", username))
+        self.login_throttle.forgive(("discord", discord_id))
+        return await self._run(self.sync._complete_user_login, username, discord_id)
+
+    async def logout_user(self, discord_id):
+        return await self._run(self.sync.logout_user, discord_id)
+
+    async def is_logged_in(self, discord_id):
+        return await self._run(self.sync.is_logged_in, discord_id)
+
+    async def login_admin(self, username, password, discord_id):
+        throttled = self._throttled(("admin", username), ("discord", discord_id))
+        if throttled:
+            return throttled
+
+        admin = await self._run(self.sync.admins.find_one, {"username": username})
+        if not admin:
+            return False, "Invalid credentials"
+        try:
+            if not await self.hasher.verify(password, admin['password']):
+                return False, "Invalid credentials"
+        except HasherBusy as e:
+            # Refused for load, not a guess; it must not count as one
+            self.login_throttle.forgive(("admin", username))
+            self.login_throttle.forgive(("discord", discord_id))
+            return False, str(e)
+
+        self.login_throttle.reset(("admin", username))
+        self.login_throttle.forgive(("discord", discord_id))
+        return await self._run(self.sync._complete_admin_login, admin, discord_id)
+
+    async def logout_admin(self, discord_id):
+        return await self._run(self.sync.logout_admin, discord_id)
+
+    async def is_admin_logged_in(self, discord_id):
+        # Cache hits are answered inline without a thread hop
+        cached = self.admin_sessions.get(discord_id)
+        if cached is not None:
+            return cached
+        return await self._run(self.sync._fetch_admin_session, discord_id)
+
+    async def get_session_version(self):
+        return await self._run(self.sync.get_session_version)
+
+    async def get_command_fingerprint(self, application_id: int):
+        return await self._run(self.sync.get_command_fingerprint, application_id)
+
+    async def set_command_fingerprint(self, application_id: int, fingerprint: str):
+        return await self._run(self.sync.set_command_fingerprint, application_id, fingerprint)
+
+    async def add_order(self, order_id: int, url: str, user_id: int):
+        if self.write_behind is not None:
+            return await self.write_behind.insert(order_id, self.sync._order_document(order_id, url, user_id))
+        return await self._run(self.sync.add_order, order_id, url, user_id)
+
+    async def add_orders(self, orders):
+        return await self._run(self.sync.add_orders, list(orders))
+
+    async def get_all_orders(self):
+        return await self._run(self.sync.get_all_orders)
+
+    async def get_orders_page(self, **kwargs):
+        return await self._run(self.sync.get_orders_page, **kwargs)
+
+    async def count_active_orders(self, terminal_statuses):
+        return await self._run(self.sync.count_active_orders, terminal_statuses)
+
+    async def get_orders_due(self, terminal_statuses, now, limit=500):
+        return await self._run(self.sync.get_orders_due, terminal_statuses, now, limit)
+
+    async def apply_status_updates(self, updates):
+        if self.write_behind is not None:
+            # Through the same journal as inserts and cancels, so an update to
+            # an unflushed order is not lost and writes land in the order made
+            return await self.write_behind.update_many(updates)
+        return await self._run(self.sync.apply_status_updates, updates)
+
+    async def get_pending_webhook_events(self, limit: int):
+        return await self._run(self.sync.get_pending_webhook_events, limit)
+
+    async def apply_webhook_events(self, event_ids, updates, applied_at):
+        if self.write_behind is not None:
+            # Journaled before the events are marked applied
+            await self.write_behind.update_many(updates)
+            return await self._run(self.sync.mark_webhook_events_applied, event_ids, applied_at)
+        return await self._run(self.sync.apply_webhook_events, event_ids, updates, applied_at)
+
+    async def enqueue_job(self, job: dict):
+        return await self._run(self.sync.enqueue_job, job)
+
+    async def claim_job(self, worker: str, now, lease: float):
+        return await self._run(self.sync.claim_job, worker, now, lease)
+
+    async def retry_job(self, job_id, worker: str, run_at, error: str):
+        return await self._run(self.sync.retry_job, job_id, worker, run_at, error)
+
+    async def finish_job(self, job_id, worker: str, state: str, now, error: str = None):
+        return await self._run(self.sync.finish_job, job_id, worker, state, now, error)
+
+    async def get_user_orders(self, user_id: int):
+        return await self._run(self.sync.get_user_orders, user_id)
+
+    async def get_order(self, order_id: int):
+        order = await self._run(self.sync.get_order, order_id)
+        if self.write_behind is not None:
+            # Includes writes not flushed yet
+            return self.write_behind.view(order_id, order)
+        return order
+
+    async def delete_order(self, order_id: int):
+        return await self._run(self.sync.delete_order, order_id)
+
+    async def update_order_status(self, order_id, status):
+        if self.write_behind is not None:
+            return await self.write_behind.update(order_id, {"status": status})
+        return await self._run(self.sync.update_order_status, order_id, status)
+
+
+if __name__ == "__main__":
+    # python database.py setup|explain
+    import sys
+    if sys.argv[1:] == ["setup"]:
+        Database().setup()
+    elif sys.argv[1:] == ["explain"]:
+        for name, plan in Database().explain_queries().items():
+            flag = "SCAN" if plan["scan"] else "ok"
+            print(f"{flag:4} {name:22} {plan['collection']:8} {' <- '.join(plan['stages'])}")
@@ -0,0 +1,223 @@
+import asyncio
+import collections
+import datetime
+import logging
+import os
+import socket
+import discord
+from panel import PanelError, is_upstream_failure
+from poller import utcnow
+from resilience import backoff_delay
+
+logger = logging.getLogger('discord_bot.jobs')
+
+# Optional split deployment. With JOB_QUEUE on, the gateway process only
+# defers the interaction and stores a job; worker processes (python worker.py)
+# claim jobs under a lease, do the panel and database work and answer through
+# the interaction's webhook. With it off the same handlers run in the bot.
+
+JOB_QUEUE = os.getenv('JOB_QUEUE', 'off').lower() in ('1', 'on', 'true', 'yes')
+JOB_LEASE = float(os.getenv('JOB_LEASE', 180))               # seconds a claim is held; covers panel retries
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 0.5))  # idle wait between claims
+JOB_CONCURRENCY = int(os.getenv('JOB_CONCURRENCY', 4))        # jobs in flight per worker process
+# Interaction tokens are valid for 15 minutes; older jobs can no longer be answered
+JOB_DEADLINE = float(os.getenv('JOB_DEADLINE', 14 * 60))
+
+
+# What handlers work with; the bot and each worker build one
+Context = collections.namedtuple('Context', 'panel db ledger')
+
+
+async def handle_order(context, user_id, service_id, url, quantity) -> dict:
+    ledger = context.ledger
+    estimate = await ledger.estimate(service_id, quantity)
+    if not ledger.can_afford(estimate):
+        return {"content": f"Insufficient balance: this order costs about {estimate:.2f} {ledger.currency} "
+                           f"and the projected balance is {ledger.projected:.2f} {ledger.currency}",
+                "ephemeral": True}
+
+    data = await context.panel.add_order(service_id, url, quantity)
+    order_id = data["order"]
+    ledger.record_order(order_id, estimate)
+    try:
+        await context.db.add_order(order_id, url, user_id)
+    except Exception as e:
+        # The order exists at the panel; the reply is the only record of its id
+        logger.error(f"Order {order_id} placed but not stored: {str(e)}", exc_info=True)
+        return {"content": f"Order placed successfully! Order ID: {order_id}\n"
+                           f"It could not be saved ({str(e)}), so /status will not find it."}
+    return {"content": f"Order placed successfully! Order ID: {order_id}"}
+
+
+async def handle_balance(context, user_id) -> dict:
+    # Answered from the ledger; the panel is only asked before the first reconciliation
+    ledger = context.ledger
+    if ledger.balance is None:
+        await ledger.reconcile()
+    embed = discord.Embed(title="Account Balance", color=discord.Color.gold())
+    embed.add_field(name="Balance", value=f"{ledger.projected:.2f} {ledger.currency}")
+    if ledger.entries:
+        embed.add_field(name="Pending spend", value=f"{ledger.pending_spend:.2f} {ledger.currency}")
+    reconciled_at = ledger.reconciled_at.replace(tzinfo=datetime.timezone.utc)
+    embed.add_field(name="Reconciled", value=discord.utils.format_dt(reconciled_at, "R"))
+    return {"embed": embed}
+
+
+async def handle_refill(context, user_id, order_id) -> dict:
+    data = await context.panel.refill(order_id)
+    if data["status"] == "Success":
+        return {"content": f"Refill request submitted successfully for order {order_id}"}
+    return {"content": f"Error: {data.get('message', 'Unknown error')}", "ephemeral": True}
+
+
+async def handle_cancel(context, user_id, order_id) -> dict:
+    # The refund reaches the ledger when the poller sees the panel's "Canceled"
+    data = await context.panel.cancel(order_id)
+    if data["status"] == "Success":
+        await context.db.update_order_status(order_id, "Cancelled")
+        return {"content": f"Order {order_id} has been marked for cancellation"}
+    return {"content": f"Error: {data.get('message', 'Unknown error')}", "ephemeral": True}
+
+
+# idempotent: safe to run again after a failure or an expired lease
+Command = collections.namedtuple('Command', 'handler label action idempotent')
+
+COMMANDS = {
+    "order": Command(handle_order, "Order", "placing order", False),
+    "balance": Command(handle_balance, "Balance", "checking balance", True),
+    "refill": Command(handle_refill, "Refill", "requesting refill", False),
+    "cancel": Command(handle_cancel, "Cancel", "cancelling order", False),
+}
+
+
+def error_reply(command: Command, error: Exception) -> dict:
+    if isinstance(error, PanelError):
+        logger.warning(f"{command.label} Panel Error: {str(error)}")
+        return {"content": str(error), "ephemeral": True}
+    logger.error(f"{command.label} Error: {str(error)}", exc_info=error)
+    return {"content": f"Error {command.action}: {str(error)}", "ephemeral": True}
+
+
+async def execute(context: Context, name: str, user_id: int, args: dict) -> dict:
+    # Runs a command in this process and returns the followup to send
+    command = COMMANDS[name]
+    try:
+        return await command.handler(context, user_id, **args)
+    except Exception as e:
+        return error_reply(command, e)
+
+
+def job_document(name: str, args: dict, interaction: discord.Interaction, now: datetime.datetime) -> dict:
+    return {
+        "command": name,
+        "args": args,
+        "user_id": interaction.user.id,
+        "application_id": interaction.application_id,
+        "token": interaction.token,
+        "state": "pending",
+        "attempts": 0,
+        "run_at": now,
+        "created_at": now,
+        "deadline": now + datetime.timedelta(seconds=JOB_DEADLINE),
+    }
+
+
+class Worker:
+    def __init__(self, context: Context, session, worker_id: str = None, concurrency: int = JOB_CONCURRENCY,
+                 lease: float = JOB_LEASE, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 poll_interval: float = JOB_POLL_INTERVAL):
+        self.context = context
+        self.db = context.db
+        self.session = session
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+        # Counters
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.expired = 0
+
+    async def deliver(self, job: dict, reply: dict):
+        # The interaction's own followup webhook; no gateway connection needed
+        webhook = discord.Webhook(
+            data={"id": job["application_id"], "type": 3, "token": job["token"]},
+            session=self.session
+        )
+        await webhook.send(**reply)
+
+    async def process(self, job: dict):
+        now = utcnow()
+        command = COMMANDS.get(job["command"])
+        if command is None:
+            self.failed += 1
+            await self.db.finish_job(job["_id"], self.worker_id, "failed", now, error="Unknown command")
+            return
+        if now >= job["deadline"]:
+            self.expired += 1
+            await self.db.finish_job(job["_id"], self.worker_id, "expired", now)
+            return
+
+        state = "done"
+        if job["attempts"] > 1 and not command.idempotent:
+            # An earlier worker lost its lease mid-run; it may have reached the panel
+            state = "failed"
+            reply = {"content": f"Could not confirm the result of {job['command']}, check /status before retrying",
+                     "ephemeral": True}
+        else:
+            try:
+                reply = await command.handler(self.context, job["user_id"], **job["args"])
+            except Exception as e:
+                if command.idempotent and isinstance(e, PanelError) and is_upstream_failure(e) \
+                        and job["attempts"] < self.max_attempts:
+                    self.retried += 1
+                    run_at = now + datetime.timedelta(seconds=backoff_delay(job["attempts"]))
+                    await self.db.retry_job(job["_id"], self.worker_id, run_at, str(e))
+                    return
+                state = "failed"
+                reply = error_reply(command, e)
+
+        error = None
+        try:
+            await self.deliver(job, reply)
+        except discord.HTTPException as e:
+            error = f"Followup failed: {e}"
+            logger.error(f"Job {job['_id']} ({job['command']}): {error}")
+
+        if state == "done":
+            self.completed += 1
+        else:
+            self.failed += 1
+        await self.db.finish_job(job["_id"], self.worker_id, state, utcnow(), error=error)
+
+    async def _loop(self):
+        while True:
+            try:
+                job = await self.db.claim_job(self.worker_id, utcnow(), self.lease)
+            except Exception as e:
+                logger.error(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self.process(job)
+            except Exception as e:
+                # Left running; the lease expires and another worker answers it
+                logger.error(f"Error processing job {job['_id']}: {e}", exc_info=True)
+
+    async def run(self):
+        logger.info(f"Worker {self.worker_id} started with concurrency {self.concurrency}")
+        await asyncio.gather(*(self._loop() for _ in range(self.concurrency)))
+
+    def stats(self) -> dict:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "expired": self.expired,
+        }
@@ -0,0 +1,169 @@
+import collections
+import datetime
+import logging
+import os
+import time
+from metrics import LEDGER_DRIFT
+from poller import utcnow
+
+logger = logging.getLogger('discord_bot.ledger')
+
+# Local view of the panel balance. A reconciliation fetches the real balance;
+# between reconciliations every order placed here is recorded as spend (the
+# catalog rate x quantity estimate, corrected to the panel's `charge` once a
+# status arrives, and refunded when the order is cancelled or partially
+# refunded). /balance answers from the reconciled balance minus that spend,
+# and orders the projected balance cannot cover are refused without asking
+# the panel. Each process keeps its own ledger.
+
+LEDGER_RECONCILE_INTERVAL = float(os.getenv('LEDGER_RECONCILE_INTERVAL', 600))  # seconds, 0 disables
+LEDGER_DRIFT_THRESHOLD = float(os.getenv('LEDGER_DRIFT_THRESHOLD', 0.01))       # drift worth a warning
+LEDGER_MAX_ORDERS = int(os.getenv('LEDGER_MAX_ORDERS', 10000))                   # orders tracked for corrections
+
+# Statuses in which the panel has returned the whole charge
+REFUNDED_STATUSES = ("Canceled", "Cancelled", "Refunded")
+
+Entry = collections.namedtuple('Entry', 'recorded_at order_id amount kind')
+
+
+def _amount(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BalanceLedger:
+    def __init__(self, panel, catalog=None, drift_threshold: float = LEDGER_DRIFT_THRESHOLD,
+                 max_orders: int = LEDGER_MAX_ORDERS):
+        self.panel = panel
+        self.catalog = catalog
+        self.drift_threshold = drift_threshold
+        self.max_orders = max_orders
+        self.balance = None         # as of the last reconciliation
+        self.currency = ""
+        self.reconciled_at = None
+        self.last_drift = None
+        self.entries = []           # spend since the last reconciliation; refunds are negative
+        # order_id -> (amount recorded so far, whether it is still our estimate)
+        self.charged = collections.OrderedDict()
+        # Estimated orders whose charge is already in the reconciled balance
+        self.settled = set()
+
+        # Counters
+        self.reconciliations = 0
+        self.drift_alerts = 0
+        self.refused = 0
+
+    @property
+    def pending_spend(self) -> float:
+        return sum(entry.amount for entry in self.entries)
+
+    @property
+    def projected(self):
+        if self.balance is None:
+            return None
+        return self.balance - self.pending_spend
+
+    async def estimate(self, service_id: int, quantity: int):
+        # Panel rates are per 1000 units; None when the service or rate is unknown
+        if self.catalog is None:
+            return None
+        if self.catalog.columns is None:
+            try:
+                await self.catalog.get()
+            except Exception as e:
+                # Without a catalog the order goes ahead unchecked
+                logger.warning(f"No catalog for a cost estimate: {e}")
+                return None
+        service = self.catalog.get_service(service_id)
+        rate = service["rate"] if service else None
+        return None if rate is None else rate * quantity / 1000
+
+    def can_afford(self, amount) -> bool:
+        # Unknown balance or cost is left for the panel to decide
+        if amount is None or self.projected is None:
+            return True
+        if amount > self.projected:
+            self.refused += 1
+            return False
+        return True
+
+    def _record(self, order_id: int, amount: float, kind: str):
+        if amount:
+            self.entries.append(Entry(time.monotonic(), order_id, amount, kind))
+
+    def record_order(self, order_id: int, amount):
+        if amount is None:
+            return
+        self.charged[order_id] = (amount, True)
+        if len(self.charged) > self.max_orders:
+            evicted, _ = self.charged.popitem(last=False)
+            self.settled.discard(evicted)
+        self._record(order_id, amount, "charge")
+
+    def observe_updates(self, updates: dict):
+        # Status $set fields per order, as written by the poller, webhooks and
+        # live refreshes. Only orders recorded here are corrected; older ones
+        # are already part of the reconciled balance.
+        for order_id, fields in updates.items():
+            if order_id not in self.charged or fields.get("status") is None:
+                continue
+            recorded, _ = self.charged[order_id]
+            if fields["status"] in REFUNDED_STATUSES:
+                actual = 0.0
+            else:
+                actual = _amount(fields.get("charge"))
+            if actual is None:
+                continue
+            self.charged[order_id] = (actual, False)
+            if order_id in self.settled:
+                # The reconciled balance already holds the real charge, which
+                # only now became known; only a refund changes it
+                self.settled.discard(order_id)
+                if actual:
+                    continue
+            delta = actual - recorded
+            self._record(order_id, delta, "refund" if delta < 0 else "adjustment")
+
+    async def reconcile(self):
+        # Entries recorded while the balance is being fetched may or may not be
+        # in it; they are kept, which errs towards a lower projection. A cached
+        # or last good reply would predate recorded entries, so only a fresh
+        # one is used; without it this raises and the ledger is left as it was.
+        started = time.monotonic()
+        data = await self.panel.balance(fresh=True)
+        balance = _amount(data.get("balance"))
+        if balance is None:
+            raise ValueError(f"Panel returned an unreadable balance: {data.get('balance')!r}")
+
+        if self.balance is not None:
+            self.last_drift = self.projected - balance
+            LEDGER_DRIFT.set(self.last_drift)
+            if abs(self.last_drift) > self.drift_threshold:
+                self.drift_alerts += 1
+                logger.warning(f"Balance drift of {self.last_drift:+.4f} {data.get('currency', '')}: "
+                               f"expected {self.projected:.4f}, panel reports {balance:.4f}")
+
+        self.balance = balance
+        self.currency = data.get("currency", self.currency)
+        self.reconciled_at = utcnow()
+        self.entries = [entry for entry in self.entries if entry.recorded_at >= started]
+        pending = {entry.order_id for entry in self.entries}
+        self.settled.update(order_id for order_id, (_, estimated) in self.charged.items()
+                            if estimated and order_id not in pending)
+        self.reconciliations += 1
+
+    def stats(self) -> dict:
+        return {
+            "balance": self.balance,
+            "projected": self.projected,
+            "pending_spend": self.pending_spend,
+            # Unix time, so it exports as a number
+            "reconciled_at": self.reconciled_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+            if self.reconciled_at else None,
+            "last_drift": self.last_drift,
+            "reconciliations": self.reconciliations,
+            "drift_alerts": self.drift_alerts,
+            "refused": self.refused,
+        }
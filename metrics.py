@@ -0,0 +1,184 @@
+import asyncio
+import bisect
+import threading
+import time
+
+# A small in-process metrics registry rendered in the Prometheus text format.
+# Recording is a dict lookup plus a few additions so it can sit on hot paths;
+# the lock is only taken when a new label combination appears and on render.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REGISTRY = []
+_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        REGISTRY.append(self)
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def _get(self, labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            with _lock:
+                series = self._series.setdefault(labelvalues, self._new_series())
+        return series
+
+    def snapshot(self):
+        with _lock:
+            return list(self._series.items())
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labelvalues, series in self.snapshot():
+            lines.extend(self._render_series(labelvalues, series))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_series(self):
+        return [0.0]
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self._get(labelvalues)[0] += amount
+
+    def _render_series(self, labelvalues, series):
+        return [f"{self.name}{_labels(self.labelnames, labelvalues)} {series[0]}"]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_series(self):
+        return [0.0]
+
+    def set(self, value: float, *labelvalues):
+        self._get(labelvalues)[0] = value
+
+    def _render_series(self, labelvalues, series):
+        return [f"{self.name}{_labels(self.labelnames, labelvalues)} {series[0]}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_series(self):
+        # Per-bucket counts (+Inf last), sum, count
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value: float, *labelvalues):
+        series = self._get(labelvalues)
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def _render_series(self, labelvalues, series):
+        counts, total, count = series
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _labels(self.labelnames, labelvalues, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {count}")
+        return lines
+
+
+def _flatten(stats: dict, prefix: str = ""):
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}_")
+        elif value is not None:
+            yield f"{prefix}{key}", value
+
+
+class StatsGauge(Metric):
+    # Read at render time from the stats() of registered components, one
+    # series per entry with nested dicts flattened by "_". Numbers and booleans
+    # are the value; a string becomes a label on a series of value 1.
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation, ["component", "stat"])
+        self._sources = {}
+
+    def register(self, component: str, stats):
+        self._sources[component] = stats
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for component, stats in list(self._sources.items()):
+            try:
+                entries = list(_flatten(stats()))
+            except Exception:
+                # One broken component must not take down the endpoint
+                continue
+            for stat, value in entries:
+                if isinstance(value, str):
+                    labels = _labels(self.labelnames, (component, stat), f'value="{_escape(value)}"')
+                    value = 1
+                else:
+                    labels = _labels(self.labelnames, (component, stat))
+                lines.append(f"{self.name}{labels} {float(value)}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in list(REGISTRY):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+COMMAND_LATENCY = Histogram("bot_command_seconds", "Slash command latency from first check to completion", ["command", "outcome"])
+FOLLOWUP_LATENCY = Histogram("bot_defer_to_followup_seconds", "Time from deferring an interaction to its followup", ["command"])
+PANEL_LATENCY = Histogram("panel_request_seconds", "SMM panel API request latency", ["action"])
+PANEL_REQUESTS = Counter("panel_requests_total", "SMM panel API requests by HTTP status and outcome", ["action", "status", "outcome"])
+DB_LATENCY = Histogram("db_operation_seconds", "Database operation latency", ["operation"])
+LOOP_LAG = Gauge("event_loop_lag_seconds", "Most recent event loop scheduling delay")
+LOOP_LAG_HISTOGRAM = Histogram("event_loop_lag_distribution_seconds", "Event loop scheduling delay",
+                               buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+JOB_RUNS = Counter("scheduler_job_runs_total", "Background job runs by outcome", ["job", "outcome"])
+JOB_DURATION = Histogram("scheduler_job_seconds", "Background job run duration", ["job"])
+COMPONENT_STATS = StatsGauge("bot_component_stat", "Counters and state reported by the panel client, "
+                             "service catalog, write-behind buffer, balance ledger, scheduler, "
+                             "admin session cache and job worker")
+LEDGER_DRIFT = Gauge("ledger_balance_drift", "Projected minus panel-reported balance at the last reconciliation")
+
+
+async def monitor_event_loop(interval: float = 1.0):
+    # How late the loop wakes us up is how long something else held it
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_HISTOGRAM.observe(lag)
@@ -0,0 +1,326 @@
+import aiohttp
+import asyncio
+import json
+import os
+import time
+import logging
+from collections import OrderedDict
+from dotenv import load_dotenv
+from resilience import CircuitBreaker, backoff_delay, RETRY_ATTEMPTS
+from metrics import PANEL_LATENCY, PANEL_REQUESTS
+from tracing import span, truncate
+
+load_dotenv()
+
+logger = logging.getLogger('discord_bot.panel')
+
+API_KEY = os.getenv('API_KEY')
+BASE_URL = os.getenv('PANEL_URL', "https://dilsmmpanel.com/api/v2")
+
+# API v2 accepts up to 100 comma separated ids per multi-status request
+STATUS_BATCH_SIZE = 100
+STATUS_CONCURRENCY = int(os.getenv('PANEL_STATUS_CONCURRENCY', 4))
+
+# Read-only actions may be coalesced and briefly cached; add/refill/cancel never are
+READ_ACTIONS = {"services", "status", "balance"}
+CACHE_TTL = float(os.getenv('PANEL_CACHE_TTL', 2))  # seconds, 0 disables
+LARGE_REPLY = int(os.getenv('PANEL_LARGE_REPLY', 256 * 1024))  # bytes; larger replies are parsed off the loop
+
+HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Cache-Control': 'no-cache',
+    'Pragma': 'no-cache'
+}
+
+
+class PanelError(Exception):
+    pass
+
+
+class PanelNetworkError(PanelError):
+    def __init__(self, error):
+        super().__init__(f"Network error: {error}")
+
+
+class PanelHTTPError(PanelError):
+    def __init__(self, status):
+        self.status = status
+        super().__init__(f"API returned status code: {status}. The website might be protected by Cloudflare.")
+
+
+class PanelEmptyResponse(PanelError):
+    def __init__(self):
+        super().__init__("API returned empty response")
+
+
+class PanelCloudflareError(PanelError):
+    def __init__(self):
+        super().__init__("The website is protected by Cloudflare. Please try again later or contact the website administrator.")
+
+
+class PanelUnavailable(PanelError):
+    def __init__(self, retry_after):
+        super().__init__(f"The panel is not responding, requests are paused. Please try again in {int(retry_after) + 1}s.")
+
+
+class PanelFormatError(PanelError):
+    def __init__(self, error):
+        super().__init__(f"Invalid API response format: {error}")
+
+
+class PanelAPIError(PanelError):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(f"Error: {message}")
+
+
+def is_upstream_failure(error: PanelError) -> bool:
+    # Failures that say the panel itself is unhealthy, as opposed to a reply
+    # we simply don't like (API errors, malformed JSON)
+    if isinstance(error, PanelHTTPError):
+        return error.status >= 500 or error.status in (403, 408, 429)
+    return isinstance(error, (PanelNetworkError, PanelEmptyResponse, PanelCloudflareError))
+
+
+class StaleDict(dict):
+    # A last good reply served while the circuit is open, in place of a fresh one
+    stale = True
+
+
+class StaleList(list):
+    stale = True
+
+
+def mark_stale(data):
+    return StaleDict(data) if isinstance(data, dict) else StaleList(data)
+
+
+def is_stale(reply) -> bool:
+    # Callers that record when something was checked must not record these
+    return getattr(reply, "stale", False)
+
+
+def classify_response(status: int, text: str):
+    # Single place that turns a raw panel reply into data or a PanelError
+    if status != 200:
+        raise PanelHTTPError(status)
+
+    if not text.strip():
+        raise PanelEmptyResponse()
+
+    if "cloudflare" in text.lower():
+        raise PanelCloudflareError()
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise PanelFormatError(e)
+
+    if isinstance(data, dict) and "error" in data:
+        raise PanelAPIError(data["error"])
+
+    return data
+
+
+class PanelClient:
+    def __init__(self, base_url: str = BASE_URL, api_key: str = API_KEY, timeout: float = 30,
+                 pool_size: int = int(os.getenv('PANEL_POOL_SIZE', 20)), cache_ttl: float = CACHE_TTL,
+                 retries: int = RETRY_ATTEMPTS):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.cache_ttl = cache_ttl
+        self._session = None
+        self._in_flight = {}
+        self._cache = {}
+        self.retries = retries
+        self.breaker = CircuitBreaker("panel")
+        self._last_good = OrderedDict()
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.retry_count = 0
+        self.fallbacks = 0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running event loop, then reused
+        # for every command so connections stay alive between calls
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request(self, action: str, fresh: bool = False, **params):
+        # Identical concurrent read requests share one upstream call and its
+        # result or error. Results are shared too, so callers must not mutate them.
+        # fresh: always a new upstream reply, never a cached or last good one,
+        # and the reply is not kept for others either
+        if action not in READ_ACTIONS or fresh:
+            return await self._call(action, params, fresh=fresh)
+
+        key = (action, tuple(sorted(params.items())))
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            self.cache_hits += 1
+            return cached[0]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._call(action, params))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or self.cache_ttl <= 0:
+            return
+
+        now = time.monotonic()
+        if len(self._cache) > 256:
+            self._cache = {k: v for k, v in self._cache.items() if v[1] > now}
+        self._cache[key] = (task.result(), now + self.cache_ttl)
+
+    async def _call(self, action: str, params: dict, fresh: bool = False):
+        # Read-only actions are retried with backoff; every action goes through
+        # the breaker, which fails fast (or serves the last good reply for
+        # read-only actions) while the panel is down
+        idempotent = action in READ_ACTIONS
+        key = (action, tuple(sorted(params.items())))
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                if idempotent and not fresh and key in self._last_good:
+                    self.fallbacks += 1
+                    logger.warning(f"Panel circuit open, serving last good {action} reply")
+                    return mark_stale(self._last_good[key])
+                raise PanelUnavailable(self.breaker.retry_after)
+
+            try:
+                data = await self._send(action, params)
+            except PanelError as e:
+                if not is_upstream_failure(e):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.retries:
+                    raise
+                attempt += 1
+                self.retry_count += 1
+                delay = backoff_delay(attempt - 1)
+                logger.info(f"Retrying {action} in {delay:.2f}s after: {e}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+
+            self.breaker.record_success()
+            if idempotent and not fresh:
+                self._last_good[key] = data
+                self._last_good.move_to_end(key)
+                if len(self._last_good) > 256:
+                    self._last_good.popitem(last=False)
+            return data
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "retries": self.retry_count,
+            "fallbacks": self.fallbacks,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "in_flight": len(self._in_flight),
+        }
+
+    async def _send(self, action: str, params: dict):
+        payload = {"key": self.api_key, "action": action, **params}
+        with span(f"panel.{action}", **params) as current:
+            started = time.perf_counter()
+            try:
+                async with self.session.post(self.base_url, json=payload) as response:
+                    text = await response.text()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                PANEL_LATENCY.observe(time.perf_counter() - started, action)
+                PANEL_REQUESTS.inc(action, "none", "PanelNetworkError")
+                logger.warning(f"panel action={action} error={truncate(str(e) or 'timeout')}")
+                raise PanelNetworkError(str(e) or "request timed out")
+            elapsed = time.perf_counter() - started
+            PANEL_LATENCY.observe(elapsed, action)
+
+            # Sizes and a bounded preview only, catalogs can be megabytes
+            logger.info(f"panel action={action} status={status} bytes={len(text)} duration_ms={elapsed * 1000:.0f}")
+            logger.debug(f"panel action={action} body={truncate(text, 500)}")
+            if current:
+                current.set(status=status, bytes=len(text))
+
+            try:
+                if len(text) > LARGE_REPLY:
+                    # Megabyte catalogs are checked and parsed on a thread
+                    data = await asyncio.get_running_loop().run_in_executor(None, classify_response, status, text)
+                else:
+                    data = classify_response(status, text)
+            except PanelError as e:
+                PANEL_REQUESTS.inc(action, status, type(e).__name__)
+                raise
+            PANEL_REQUESTS.inc(action, status, "ok")
+            return data
+
+    async def services(self, fresh: bool = False) -> list:
+        return await self.request("services", fresh=fresh)
+
+    async def add_order(self, service: int, url: str, quantity: int) -> dict:
+        return await self.request("add", service=service, url=url, quantity=quantity)
+
+    async def order_status(self, order: int) -> dict:
+        return await self.request("status", order=order)
+
+    async def multi_status(self, orders: list, batch_size: int = STATUS_BATCH_SIZE,
+                           concurrency: int = STATUS_CONCURRENCY) -> dict:
+        # Returns {order_id: status dict}; a failed chunk marks its orders with an error
+        # instead of failing the whole lookup, and a stale chunk marks them stale
+        chunks = [orders[i:i + batch_size] for i in range(0, len(orders), batch_size)]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(chunk):
+            async with semaphore:
+                return await self.request("status", orders=",".join(str(order) for order in chunk))
+
+        results = await asyncio.gather(*(fetch(chunk) for chunk in chunks), return_exceptions=True)
+
+        statuses = {}
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, PanelError):
+                for order in chunk:
+                    statuses[order] = {"error": str(result)}
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                for order, data in result.items():
+                    statuses[int(order)] = mark_stale(data) if is_stale(result) else data
+        return statuses
+
+    async def balance(self, fresh: bool = False) -> dict:
+        return await self.request("balance", fresh=fresh)
+
+    async def refill(self, order: int) -> dict:
+        return await self.request("refill", order=order)
+
+    async def cancel(self, order: int) -> dict:
+        return await self.request("cancel", order=order)
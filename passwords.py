@@ -0,0 +1,94 @@
+import asyncio
+import os
+import time
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', 2))
+PASSWORD_MAX_PENDING = int(os.getenv('PASSWORD_MAX_PENDING', 16))
+LOGIN_MAX_ATTEMPTS = int(os.getenv('LOGIN_MAX_ATTEMPTS', 5))
+LOGIN_WINDOW = float(os.getenv('LOGIN_WINDOW', 300))  # seconds
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> bytes:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds))
+
+
+def check_password(password: str, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed)
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    # bcrypt is deliberately slow, so it runs on a small worker pool instead of
+    # the event loop (bcrypt releases the GIL while hashing). The worker count
+    # caps how many cores logins can use, and requests beyond max_pending are
+    # refused instead of queueing without bound.
+    def __init__(self, max_workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING,
+                 rounds: int = BCRYPT_ROUNDS):
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+
+    async def _run(self, func, *args):
+        if self._pending >= self.max_pending:
+            raise HasherBusy("Login service is busy, please try again shortly.")
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> bytes:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed: bytes) -> bool:
+        return await self._run(check_password, password, hashed)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class LoginThrottle:
+    # Sliding window of login attempts per key (Discord id or username)
+    def __init__(self, max_attempts: int = LOGIN_MAX_ATTEMPTS, window: float = LOGIN_WINDOW):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._attempts = {}
+
+    def _recent(self, key, now):
+        attempts = [t for t in self._attempts.get(key, []) if now - t < self.window]
+        if attempts:
+            self._attempts[key] = attempts
+        else:
+            self._attempts.pop(key, None)
+        return attempts
+
+    def retry_after(self, key) -> float:
+        # Seconds until another attempt is allowed, 0 if allowed now
+        now = time.monotonic()
+        attempts = self._recent(key, now)
+        if len(attempts) < self.max_attempts:
+            return 0
+        return self.window - (now - attempts[0])
+
+    def record(self, key):
+        self._attempts.setdefault(key, []).append(time.monotonic())
+
+    def reset(self, key):
+        self._attempts.pop(key, None)
+
+    def forgive(self, key):
+        # Drops one recorded attempt, for an attempt that turned out to be a
+        # successful login; earlier failures still count
+        attempts = self._attempts.get(key)
+        if attempts:
+            attempts.pop()
+            if not attempts:
+                del self._attempts[key]
@@ -0,0 +1,82 @@
+import datetime
+import os
+import logging
+from panel import is_stale
+
+logger = logging.getLogger('discord_bot.poller')
+
+# Orders in these states never change again at the panel. "Cancelled" is not
+# one: /cancel stores it locally when the panel accepts a cancel request, and
+# the order is polled until the panel reports the outcome (and the refund).
+TERMINAL_STATUSES = ["Completed", "Canceled", "Refunded"]
+
+POLL_TICK = float(os.getenv('POLL_TICK', 30))                  # seconds between scans for due orders
+POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', 60))   # fresh orders
+POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', 3600)) # old orders
+POLL_AGE_FACTOR = float(os.getenv('POLL_AGE_FACTOR', 0.1))      # interval as a fraction of order age
+POLL_BATCH = int(os.getenv('POLL_BATCH', 500))                  # max orders refreshed per tick
+
+STATUS_FIELDS = ("status", "charge", "start_count", "remains")
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def next_check_delay(created_at, now) -> float:
+    # Poll often while an order is fresh and back off as it ages
+    if created_at is None:
+        return POLL_MIN_INTERVAL
+    age = (now - created_at.replace(tzinfo=None)).total_seconds()
+    return min(POLL_MAX_INTERVAL, max(POLL_MIN_INTERVAL, age * POLL_AGE_FACTOR))
+
+
+def status_update(order, data, now) -> dict:
+    # Fields to $set on an order document for one panel status reply
+    update = {
+        "status_checked_at": now,
+        "next_check_at": now + datetime.timedelta(seconds=next_check_delay(order.get("created_at"), now))
+    }
+    if "error" in data:
+        update["status_error"] = data["error"]
+    else:
+        update.update({field: data.get(field) for field in STATUS_FIELDS})
+        update["status_error"] = None
+    return update
+
+
+class StatusPoller:
+    def __init__(self, db, panel, tick: float = POLL_TICK, batch: int = POLL_BATCH, ledger=None):
+        self.db = db
+        self.panel = panel
+        self.ledger = ledger
+        self.tick = tick
+        self.batch = batch
+        self.polls = 0
+        self.orders_refreshed = 0
+
+    async def poll_once(self) -> int:
+        now = utcnow()
+        orders = await self.db.get_orders_due(TERMINAL_STATUSES, now, self.batch)
+        if not orders:
+            return 0
+
+        statuses = await self.panel.multi_status([order["order_id"] for order in orders])
+        updates = {}
+        for order in orders:
+            data = statuses.get(order["order_id"])
+            if data is None or is_stale(data):
+                # Stays due; a fallback reply is not a check
+                continue
+            updates[order["order_id"]] = status_update(order, data, now)
+
+        if updates:
+            await self.db.apply_status_updates(updates)
+            if self.ledger is not None:
+                self.ledger.observe_updates(updates)
+
+        self.polls += 1
+        self.orders_refreshed += len(updates)
+        if updates:
+            logger.info(f"Refreshed status of {len(updates)} order(s)")
+        return len(updates)
@@ -0,0 +1,80 @@
+import os
+import random
+import time
+import logging
+
+logger = logging.getLogger('discord_bot.resilience')
+
+BREAKER_THRESHOLD = int(os.getenv('PANEL_BREAKER_THRESHOLD', 5))        # consecutive failures before opening
+BREAKER_RESET_TIMEOUT = float(os.getenv('PANEL_BREAKER_RESET', 30))     # seconds open before a probe
+RETRY_ATTEMPTS = int(os.getenv('PANEL_RETRIES', 2))                     # retries after the first try
+RETRY_BACKOFF = float(os.getenv('PANEL_BACKOFF', 0.5))                  # seconds, doubled per retry
+RETRY_BACKOFF_MAX = float(os.getenv('PANEL_BACKOFF_MAX', 8))
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BACKOFF, cap: float = RETRY_BACKOFF_MAX) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if self.retry_after > 0:
+                return False
+            self.state = self.HALF_OPEN
+            logger.info(f"Circuit {self.name} half-open, probing")
+        # Half-open: let exactly one probe through
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release(self):
+        # The call ended without telling us anything about the upstream (e.g. cancelled)
+        self._probing = False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit {self.name} opened after {self.failures} consecutive failure(s)")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "times_opened": self.times_opened,
+            "retry_after": self.retry_after if self.state == self.OPEN else 0.0,
+        }
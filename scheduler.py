@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from metrics import JOB_RUNS, JOB_DURATION
+
+logger = logging.getLogger('discord_bot.scheduler')
+
+# Named background jobs, each started at most once per process however often
+# on_ready fires. A periodic job runs its function every `interval` seconds; a
+# job without an interval is a long-running coroutine that is restarted if it
+# ever returns. Failures are logged and retried with exponential backoff.
+
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 300.0
+
+
+class Job:
+    def __init__(self, name: str, func, interval: float = None, backoff: float = RESTART_BACKOFF,
+                 backoff_max: float = RESTART_BACKOFF_MAX):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.task = None
+
+        # Counters
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_duration = None
+        self.total_duration = 0.0
+        self.last_error = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def _retry_delay(self) -> float:
+        return min(self.backoff_max, self.backoff * 2 ** (self.consecutive_failures - 1))
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            try:
+                await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                delay = self._retry_delay()
+                logger.error(f"Job {self.name} failed ({self.last_error}), retrying in {delay:.1f}s")
+                outcome = "error"
+            else:
+                self.consecutive_failures = 0
+                delay = self.interval
+                outcome = "ok"
+                if delay is None:
+                    # Long-running jobs are not meant to return
+                    delay = self.backoff
+                    logger.warning(f"Job {self.name} returned, restarting in {delay:.1f}s")
+            finally:
+                duration = time.perf_counter() - started
+                self.runs += 1
+                self.last_duration = duration
+                self.total_duration += duration
+
+            JOB_RUNS.inc(self.name, outcome)
+            JOB_DURATION.observe(duration, self.name)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_duration": self.last_duration,
+            "avg_duration": self.total_duration / self.runs if self.runs else None,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs = {}
+
+    def add(self, name: str, func, interval: float = None, **kwargs) -> Job:
+        if name in self.jobs:
+            raise ValueError(f"Job {name} is already registered")
+        job = Job(name, func, interval, **kwargs)
+        self.jobs[name] = job
+        return job
+
+    def start(self):
+        # Safe to call on every ready event; only jobs not already running start
+        for job in self.jobs.values():
+            if not job.running:
+                job.task = asyncio.create_task(job._run(), name=f"job:{job.name}")
+                logger.info(f"Started job {job.name}")
+
+    async def stop(self):
+        tasks = [job.task for job in self.jobs.values() if job.running]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            job.task = None
+
+    def stats(self, errors: bool = True) -> dict:
+        # errors=False leaves out the free-text last errors (for metrics labels)
+        stats = {name: job.stats() for name, job in self.jobs.items()}
+        if not errors:
+            for job_stats in stats.values():
+                del job_stats["last_error"]
+        return stats
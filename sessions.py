@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+
+ADMIN_SESSION_TTL = float(os.getenv('ADMIN_SESSION_TTL', 60))  # seconds
+
+
+class AdminSessionCache:
+    # Remembers whether a Discord user is a logged in admin so the is_admin()
+    # check does not hit Mongo before every command. Entries expire after the
+    # TTL and are invalidated explicitly on login/logout. Other bot processes
+    # bump a shared version number, which clears the whole cache here.
+    def __init__(self, ttl: float = ADMIN_SESSION_TTL):
+        self.ttl = ttl
+        self.version = None
+        self._entries = {}
+        # Bumped by every login, logout and invalidation; a value read from
+        # Mongo before a bump may be stale and is not cached (see fill)
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, discord_id: int):
+        entry = self._entries.get(discord_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        logged_in, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[discord_id]
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return logged_in
+
+    def _store(self, discord_id: int, logged_in: bool):
+        if self.ttl > 0:
+            self._entries[discord_id] = (logged_in, time.monotonic() + self.ttl)
+
+    def set(self, discord_id: int, logged_in: bool):
+        # An explicit login or logout
+        with self._lock:
+            self.generation += 1
+            self._store(discord_id, logged_in)
+
+    def fill(self, discord_id: int, logged_in: bool, generation: int) -> bool:
+        # Caches a value read from Mongo, unless a login, logout or invalidation
+        # happened after `generation` was taken, before the read
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self._store(discord_id, logged_in)
+            return True
+
+    def invalidate(self, discord_id: int = None):
+        with self._lock:
+            self.generation += 1
+            if discord_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(discord_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "version": self.version,
+        }
+
+    def sync_version(self, version: int) -> bool:
+        # Returns True when another instance changed a session since the last sync
+        if version == self.version:
+            return False
+        changed = self.version is not None
+        self.version = version
+        if changed:
+            self.invalidate()
+        return changed
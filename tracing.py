@@ -0,0 +1,119 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+# Lightweight per-interaction tracing. A sampled interaction gets a root span,
+# work done on its behalf opens child spans, and finished spans are written as
+# JSON lines to a rotating file by a background thread.
+
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.1))  # 0 disables tracing
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', 10 * 1024 * 1024))
+TRACE_BACKUPS = int(os.getenv('TRACE_BACKUPS', 3))
+TRACE_MAX_ATTRIBUTE = int(os.getenv('TRACE_MAX_ATTRIBUTE', 256))
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+_exporter = logging.getLogger('discord_bot.trace')
+_exporter.propagate = False
+_exporter.setLevel(logging.INFO)
+_listener = None
+
+
+def truncate(value, limit: int = TRACE_MAX_ATTRIBUTE) -> str:
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+def _start_exporter():
+    # File writes happen on the listener thread, the loop only enqueues
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()
+    file_handler = logging.handlers.RotatingFileHandler(
+        TRACE_FILE, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding='utf-8'
+    )
+    file_handler.setFormatter(logging.Formatter('%(message)s'))
+    _exporter.addHandler(logging.handlers.QueueHandler(records))
+    _listener = logging.handlers.QueueListener(records, file_handler)
+    _listener.start()
+
+
+def shutdown():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'started', 'start_time', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = {key: truncate(value) for key, value in (attributes or {}).items()}
+        self.started = time.perf_counter()
+        self.start_time = time.time()
+        self.error = None
+
+    def set(self, **attributes):
+        for key, value in attributes.items():
+            self.attributes[key] = truncate(value)
+
+    def finish(self, error: BaseException = None):
+        if error is not None and self.error is None:
+            self.error = truncate(f"{type(error).__name__}: {error}")
+        _exporter.info(json.dumps({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }))
+
+
+def start_trace(name: str, **attributes):
+    # Returns the root span, or None when this interaction is not sampled
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return None
+    _start_exporter()
+    root = Span(name, uuid.uuid4().hex, attributes=attributes)
+    _current_span.set(root)
+    return root
+
+
+@contextmanager
+def span(name: str, **attributes):
+    # Child of the current span; a no-op outside a sampled trace
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, parent.trace_id, parent.span_id, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.finish(e)
+        raise
+    else:
+        child.finish()
+    finally:
+        _current_span.reset(token)
@@ -0,0 +1,133 @@
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import os
+from poller import STATUS_FIELDS, POLL_MAX_INTERVAL, utcnow
+
+logger = logging.getLogger('discord_bot.webhooks')
+
+# Order-status callbacks from the panel. api/index.py verifies and stores them
+# in the webhook_events collection and acknowledges; WebhookConsumer applies
+# stored events to the orders collection in batches. Events are keyed by id,
+# so a replayed callback is stored once and applied once.
+
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')                     # empty disables ingestion
+WEBHOOK_SIGNATURE_HEADER = os.getenv('WEBHOOK_SIGNATURE_HEADER', 'X-Signature')
+WEBHOOK_MAX_BODY = int(os.getenv('WEBHOOK_MAX_BODY', 1024 * 1024))
+WEBHOOK_MAX_EVENTS = int(os.getenv('WEBHOOK_MAX_EVENTS', 1000))      # per request
+WEBHOOK_BATCH = int(os.getenv('WEBHOOK_BATCH', 500))                 # events applied per round trip
+WEBHOOK_INTERVAL = float(os.getenv('WEBHOOK_INTERVAL', 5))           # consumer tick, 0 disables it
+
+
+def sign(body: bytes, secret: str = WEBHOOK_SECRET) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: str, secret: str = WEBHOOK_SECRET) -> bool:
+    # Accepts the digest with or without the "sha256=" prefix
+    if not secret or not signature:
+        return False
+    expected = sign(body, secret)
+    if not signature.startswith("sha256="):
+        signature = "sha256=" + signature
+    return hmac.compare_digest(expected, signature.strip())
+
+
+def event_id(item: dict) -> str:
+    # The panel's own event id when it sends one, otherwise a digest of the
+    # payload. A bare "id" is not used: panels often send the order id there,
+    # which would make every later callback for the order look like a replay.
+    explicit = item.get("event_id")
+    if explicit:
+        return str(explicit)
+    return hashlib.sha256(json.dumps(item, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def parse_events(body: bytes, now: datetime.datetime) -> list:
+    # One callback, a list of them, or {"orders": [...]}; raises ValueError
+    # with a message fit for the HTTP response
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Body is not valid JSON")
+
+    if isinstance(data, dict) and isinstance(data.get("orders"), list):
+        data = data["orders"]
+    items = data if isinstance(data, list) else [data]
+    if len(items) > WEBHOOK_MAX_EVENTS:
+        raise ValueError(f"At most {WEBHOOK_MAX_EVENTS} events per request")
+
+    events = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Each event must be a JSON object")
+        try:
+            order_id = int(item.get("order", item.get("order_id")))
+        except (TypeError, ValueError):
+            raise ValueError("Each event needs a numeric order id")
+        if not item.get("status"):
+            raise ValueError(f"Event for order {order_id} has no status")
+        events.append({
+            "_id": event_id(item),
+            "order_id": order_id,
+            "data": {field: item[field] for field in STATUS_FIELDS if field in item},
+            "received_at": now,
+            "applied_at": None,
+        })
+    return events
+
+
+def webhook_update(data: dict, now: datetime.datetime) -> dict:
+    # Fields to $set for one callback. A callback carrying every status field
+    # counts as a check: the poller stays as a backstop for lost callbacks, so
+    # the next poll is pushed out to the longest interval. A partial one (only
+    # status is required) leaves the check times alone so the poller or a live
+    # lookup fills in the rest.
+    update = {field: data[field] for field in STATUS_FIELDS if field in data}
+    if len(update) == len(STATUS_FIELDS):
+        update["status_checked_at"] = now
+        update["next_check_at"] = now + datetime.timedelta(seconds=POLL_MAX_INTERVAL)
+        update["status_error"] = None
+    return update
+
+
+class WebhookConsumer:
+    def __init__(self, db, batch: int = WEBHOOK_BATCH, ledger=None):
+        self.db = db
+        self.batch = batch
+        self.ledger = ledger
+        self.batches = 0
+        self.events_applied = 0
+
+    async def consume_once(self) -> int:
+        events = await self.db.get_pending_webhook_events(self.batch)
+        if not events:
+            return 0
+
+        now = utcnow()
+        updates = {}
+        # Events come oldest first, so the latest callback for an order wins
+        for event in events:
+            updates.setdefault(event["order_id"], {}).update(webhook_update(event["data"], now))
+        await self.db.apply_webhook_events([event["_id"] for event in events], updates, now)
+        if self.ledger is not None:
+            self.ledger.observe_updates(updates)
+
+        self.batches += 1
+        self.events_applied += len(events)
+        return len(events)
+
+    async def consume_pending(self) -> int:
+        # Drains the queue; one scheduler tick
+        applied = 0
+        while True:
+            count = await self.consume_once()
+            applied += count
+            # A full batch means more are waiting
+            if count < self.batch:
+                break
+        if applied:
+            logger.info(f"Applied {applied} webhook event(s)")
+        return applied
@@ -0,0 +1,71 @@
+import asyncio
+import functools
+import logging
+import os
+import sys
+import aiohttp
+from dotenv import load_dotenv
+from database import AsyncDatabase
+from panel import PanelClient
+from catalog import ServiceCatalog
+from jobs import JOB_QUEUE, Context, Worker
+from ledger import BalanceLedger, LEDGER_RECONCILE_INTERVAL
+from metrics import COMPONENT_STATS, monitor_event_loop
+from scheduler import Scheduler
+from writebehind import WRITE_BEHIND_INTERVAL
+import tracing
+
+# Worker process for the split deployment (JOB_QUEUE=on). Run as many as
+# needed next to one gateway: python worker.py
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('discord_bot.worker')
+
+load_dotenv()
+
+
+async def main():
+    db = AsyncDatabase()
+    panel = PanelClient()
+    catalog = ServiceCatalog(panel)
+    ledger = BalanceLedger(panel, catalog)
+    scheduler = Scheduler()
+    scheduler.add("event_loop_monitor", monitor_event_loop)
+    if LEDGER_RECONCILE_INTERVAL > 0:
+        scheduler.add("ledger_reconcile", ledger.reconcile, LEDGER_RECONCILE_INTERVAL)
+    if WRITE_BEHIND_INTERVAL > 0:
+        scheduler.add("write_behind", db.flush, WRITE_BEHIND_INTERVAL)
+    scheduler.start()
+    COMPONENT_STATS.register("panel", panel.stats)
+    COMPONENT_STATS.register("catalog", catalog.stats)
+    COMPONENT_STATS.register("write_behind", db.write_behind_stats)
+    COMPONENT_STATS.register("ledger", ledger.stats)
+    COMPONENT_STATS.register("scheduler", functools.partial(scheduler.stats, errors=False))
+    try:
+        async with aiohttp.ClientSession() as session:
+            worker = Worker(Context(panel, db, ledger), session)
+            COMPONENT_STATS.register("worker", worker.stats)
+            await worker.run()
+    finally:
+        await scheduler.stop()
+        await db.flush()
+        await panel.close()
+        db.close()
+        tracing.shutdown()
+
+
+if __name__ == "__main__":
+    if not JOB_QUEUE:
+        # The gateway answers every command itself; a worker would only poll
+        # an empty queue and reconcile the balance for nothing
+        sys.exit("JOB_QUEUE is off, nothing for a worker to do. Set JOB_QUEUE=on for the bot and its workers.")
+    if os.getenv('METRICS_PORT'):
+        from api.index import serve_in_background
+        serve_in_background(int(os.getenv('METRICS_PORT')))
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Worker stopped")
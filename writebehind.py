@@ -0,0 +1,307 @@
+import asyncio
+import datetime
+import glob
+import itertools
+import json
+import logging
+import os
+import re
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger('discord_bot.writebehind')
+
+# Write-behind buffer for order inserts and every status update (cancels,
+# polls, webhooks, live lookups), so one process's writes to an order land in
+# the order they were made, unflushed ones included. Writes are
+# journaled to a local append-only file and acknowledged at once, then written
+# to Mongo with one bulk_write when the buffer reaches WRITE_BEHIND_SIZE or on
+# the WRITE_BEHIND_INTERVAL flush. A journal left by a crash is loaded on start
+# and flushed like any other pending write. Every operation is idempotent
+# (inserts are $setOnInsert upserts), so replaying one that already reached
+# Mongo is harmless.
+#
+# Each process holds an exclusive lock on its journal for as long as it runs.
+# WRITE_BEHIND_JOURNAL is the first slot; a process that finds it locked takes
+# the next free one (orders.journal.1, orders.journal.2, ...). On start, journals
+# in other slots that no running process holds were left by a crash and are
+# taken over.
+
+WRITE_BEHIND_INTERVAL = float(os.getenv('WRITE_BEHIND_INTERVAL', 1))      # seconds between flushes, 0 disables
+WRITE_BEHIND_SIZE = int(os.getenv('WRITE_BEHIND_SIZE', 100))              # pending writes that trigger a flush
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', 1000))  # writers wait beyond this
+WRITE_BEHIND_JOURNAL = os.getenv('WRITE_BEHIND_JOURNAL', 'orders.journal')  # first slot; see above
+WRITE_BEHIND_FSYNC = os.getenv('WRITE_BEHIND_FSYNC', 'off').lower() in ('1', 'on', 'true', 'yes')
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode(value: dict):
+    if value.keys() == {"$date"}:
+        return datetime.datetime.fromisoformat(value["$date"])
+    return value
+
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock(f):
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+else:
+    import fcntl
+
+    def _lock(f):
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _try_lock(journal_path: str):
+    # The lock lives in a side file; the journal itself is replaced and removed
+    f = open(f"{journal_path}.lock", 'a')
+    try:
+        _lock(f)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _slot(base: str, number: int) -> str:
+    return base if number == 0 else f"{base}.{number}"
+
+
+def claim_journal(base: str):
+    # First slot no other process holds; returns (path, open lock file)
+    for number in itertools.count():
+        path = _slot(base, number)
+        lock = _try_lock(path)
+        if lock is not None:
+            return path, lock
+
+
+def _slot_paths(base: str) -> list:
+    pattern = re.compile(re.escape(base) + r"(\.\d+)?$")
+    return sorted(path for path in glob.glob(glob.escape(base) + "*") if pattern.match(path))
+
+
+def _read_journal(path: str) -> list:
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                kind, order_id, payload = json.loads(line, object_hook=_decode)
+            except ValueError:
+                # A torn final line from a crash mid-write
+                logger.warning(f"Skipping unreadable journal line in {path}")
+                continue
+            entries.append((kind, order_id, payload))
+    return entries
+
+
+class WriteBehindBuffer:
+    def __init__(self, collection, executor, journal_path: str = WRITE_BEHIND_JOURNAL,
+                 flush_size: int = WRITE_BEHIND_SIZE, max_pending: int = WRITE_BEHIND_MAX_PENDING,
+                 fsync: bool = WRITE_BEHIND_FSYNC):
+        self.collection = collection
+        self.executor = executor
+        self.journal_base = journal_path
+        self.journal_path, self._journal_lock = claim_journal(journal_path)
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.pending = []   # ("insert", order_id, document) or ("update", order_id, fields), oldest first
+        self.overlay = {}   # order_id -> {"document": unflushed insert or None, "fields": unflushed $set}
+        self._flush_task = None
+
+        # Counters
+        self.flushes = 0
+        self.flushed_writes = 0
+        self.flush_errors = 0
+        self.dropped_writes = 0
+        self.backpressure_waits = 0
+        self.replayed = self._load_journal()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _load_journal(self) -> int:
+        if os.path.exists(self.journal_path):
+            self.pending.extend(_read_journal(self.journal_path))
+
+        # Journals of crashed processes: copied into ours before they are removed
+        for path in _slot_paths(self.journal_base):
+            if path == self.journal_path:
+                continue
+            lock = _try_lock(path)
+            if lock is None:
+                continue
+            try:
+                entries = _read_journal(path)
+                if entries:
+                    self.pending.extend(entries)
+                    self._rewrite_journal()
+                    logger.info(f"Took over {len(entries)} unflushed write(s) from {path}")
+                os.remove(path)
+            finally:
+                lock.close()
+
+        self._rebuild_overlay()
+        if self.pending:
+            logger.info(f"Loaded {len(self.pending)} unflushed write(s) into {self.journal_path}")
+        return len(self.pending)
+
+    def _append_journal(self, entries: list):
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(entry, default=_encode) + "\n" for entry in entries))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _rewrite_journal(self):
+        # Only what is still pending; replaced atomically
+        if not self.pending:
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            return
+        temporary = f"{self.journal_path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            for entry in self.pending:
+                f.write(json.dumps(entry, default=_encode) + "\n")
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temporary, self.journal_path)
+
+    def _overlay_entry(self, order_id: int) -> dict:
+        return self.overlay.setdefault(order_id, {"document": None, "fields": {}})
+
+    def _apply_overlay(self, kind: str, order_id: int, payload: dict):
+        entry = self._overlay_entry(order_id)
+        if kind == "insert":
+            entry["document"] = dict(payload)
+        else:
+            entry["fields"].update(payload)
+
+    def _rebuild_overlay(self):
+        self.overlay = {}
+        for kind, order_id, payload in self.pending:
+            self._apply_overlay(kind, order_id, payload)
+
+    async def _add(self, entries: list):
+        # Journaled first, so the writes are durable whatever happens next
+        if not entries:
+            return
+        self._append_journal(entries)
+        for kind, order_id, payload in entries:
+            self.pending.append((kind, order_id, payload))
+            self._apply_overlay(kind, order_id, payload)
+
+        if len(self.pending) >= self.max_pending:
+            # Backpressure: a full buffer makes writers wait for a flush. A
+            # failed flush is not the writer's error; its write is kept.
+            self.backpressure_waits += 1
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Write-behind buffer full and Mongo unavailable, "
+                               f"{len(self.pending)} write(s) kept in {self.journal_path}: {e}")
+        elif len(self.pending) >= self.flush_size:
+            self._start_flush()
+
+    async def insert(self, order_id: int, document: dict):
+        await self._add([("insert", order_id, document)])
+
+    async def update(self, order_id: int, fields: dict):
+        await self._add([("update", order_id, fields)])
+
+    async def update_many(self, updates: dict):
+        # {order_id: fields}, journaled in one append
+        await self._add([("update", order_id, fields) for order_id, fields in updates.items()])
+
+    def view(self, order_id: int, stored: dict = None):
+        # The order as it will look once flushed: the stored document (or the
+        # unflushed insert) with unflushed updates applied
+        entry = self.overlay.get(order_id)
+        if entry is None:
+            return stored
+        base = stored if stored is not None else entry["document"]
+        if base is None:
+            return None
+        merged = dict(base)
+        merged.update(entry["fields"])
+        merged.pop("_id", None)
+        return merged
+
+    def _start_flush(self) -> asyncio.Task:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+            self._flush_task.add_done_callback(self._log_flush_error)
+        return self._flush_task
+
+    def _log_flush_error(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Write-behind flush failed, {len(self.pending)} write(s) kept: {task.exception()}")
+
+    async def flush(self) -> int:
+        # Concurrent callers share the flush in progress
+        if not self.pending and (self._flush_task is None or self._flush_task.done()):
+            return 0
+        return await asyncio.shield(self._start_flush())
+
+    async def _flush(self) -> int:
+        batch = self.pending[:self.max_pending]
+        if not batch:
+            return 0
+        requests = [
+            UpdateOne({"order_id": order_id}, {"$setOnInsert": payload}, upsert=True) if kind == "insert"
+            else UpdateOne({"order_id": order_id}, {"$set": payload})
+            for kind, order_id, payload in batch
+        ]
+
+        loop = asyncio.get_running_loop()
+        done = len(batch)
+        try:
+            # Ordered, so an order's insert lands before its updates
+            await loop.run_in_executor(self.executor, lambda: self.collection.bulk_write(requests, ordered=True))
+        except BulkWriteError as e:
+            # Everything before the failed write was applied; the failed one
+            # would fail again, so it is dropped and the rest stay pending
+            errors = e.details.get("writeErrors", [])
+            if not errors:
+                self.flush_errors += 1
+                raise
+            index = errors[0]["index"]
+            logger.error(f"Dropping write-behind {batch[index][0]} for order {batch[index][1]}: "
+                         f"{errors[0].get('errmsg')}")
+            self.dropped_writes += 1
+            done = index + 1
+        except Exception:
+            self.flush_errors += 1
+            raise
+
+        # Writes added while the flush ran are kept after the flushed prefix
+        self.pending = self.pending[done:]
+        self._rebuild_overlay()
+        self._rewrite_journal()
+        self.flushes += 1
+        self.flushed_writes += done
+        return done
+
+    def close(self):
+        # Frees the slot; anything unflushed is taken over by the next process
+        self._journal_lock.close()
+
+    def stats(self) -> dict:
+        return {
+            "journal": self.journal_path,
+            "pending": len(self.pending),
+            "flushes": self.flushes,
+            "flushed_writes": self.flushed_writes,
+            "flush_errors": self.flush_errors,
+            "dropped_writes": self.dropped_writes,
+            "backpressure_waits": self.backpressure_waits,
+            "replayed": self.replayed,
+        }